@@ -2,7 +2,6 @@ import os
 import asyncio
 import logging
 import json
-import boto3
 import uuid
 import discord
 import random
@@ -14,6 +13,9 @@ import botocore.exceptions  # Import botocore.exceptions
 # Load environment variables
 load_dotenv()
 
+# Imported after load_dotenv so the agent client sees the .env settings
+from invoke_agent_async import AsyncAgentClient
+
 # Logging configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -46,34 +48,25 @@ class BedrockAgent:
     def __init__(self):
         if not BEDROCK_AGENT_ID or not BEDROCK_AGENT_ALIAS:
             raise ValueError("BEDROCK_AGENT_ID and BEDROCK_AGENT_ALIAS environment variables must be set")
-        self.client = boto3.client(
-            'bedrock-agent-runtime',
-            region_name=AWS_REGION,
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-        )
+        # Calls run on the bot's event loop, so a slow answer no longer blocks
+        # every other command while it streams in
+        self.client = AsyncAgentClient(region=AWS_REGION)
 
     async def invoke_agent(self, prompt):
         session_id = str(uuid.uuid4())  # Generate a unique session ID
+        event = {
+            "sessionId": session_id,
+            "question": prompt,
+            "agentId": BEDROCK_AGENT_ID,
+            "agentAliasId": BEDROCK_AGENT_ALIAS
+        }
         try:
-            response = self.client.invoke_agent(
-                agentId=BEDROCK_AGENT_ID,
-                agentAliasId=BEDROCK_AGENT_ALIAS,
-                sessionId=session_id,
-                inputText=prompt
-            )
-
             full_response = ""
-            for event in response['completion']:
-                if 'chunk' in event:
-                    chunk = event['chunk']
-                    if 'bytes' in chunk:
-                        full_response += chunk['bytes'].decode('utf-8')
+            # through agent_gateway when AGENT_GATEWAY_URL is set
+            async for text in self.client.stream_event(event):
+                full_response += text
 
             return full_response
-        except botocore.exceptions.ClientError as e:
-            logger.error(f"AWS ClientError invoking Bedrock agent: {str(e)}", exc_info=True)
-            raise
         except Exception as e:
             logger.error(f"Error invoking Bedrock agent: {str(e)}", exc_info=True)
             raise
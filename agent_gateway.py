@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+
+import invoke_agent as agenthelper
+import rate_limit
+import sse
+from hedging import LatencyTracker
+
+# Standalone HTTP service in front of the agent, so agent traffic scales apart
+# from the UI processes. It owns one worker pool, one connection pool, the
+# answer cache and the metrics for every front-end that points
+# AGENT_GATEWAY_URL at it. Plain ASGI, served by uvicorn:
+#
+#   python agent_gateway.py --port 8080
+#   uvicorn agent_gateway:app --port 8080
+#
+#   POST /invoke   lambda_handler event in, {"status_code", "body"} semantics out:
+#                  the HTTP status is status_code and the response is the body
+#   POST /stream   lambda_handler_stream event in, server-sent events out:
+#                  "trace" and "chunk" as they arrive, then "done" or "error"
+#   GET  /metrics  request, cache, single-flight, session, hedging, response length,
+#                  region and rate-limit counters
+#   GET  /healthz  liveness
+
+WORKERS = int(os.environ.get("AGENT_GATEWAY_WORKERS", "32"))
+# requests admitted at once, running or waiting for a worker; more get a 503
+MAX_PENDING = int(os.environ.get("AGENT_GATEWAY_MAX_PENDING", "256"))
+
+
+class GatewayMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests = {}
+        self.statuses = {}
+        self.in_flight = 0
+        self.rejected = 0
+        self.latencies = LatencyTracker(window=1000)
+
+    def begin(self, path):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.in_flight += 1
+
+    def end(self, status, seconds):
+        with self._lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.in_flight -= 1
+        self.latencies.observe(seconds)
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        def ms(pct):
+            value = self.latencies.percentile(pct)
+            return round(value * 1000, 1) if value is not None else None
+
+        with self._lock:
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "requests": dict(self.requests),
+                "statuses": {str(status): count for status, count in self.statuses.items()},
+                "in_flight": self.in_flight,
+                "rejected": self.rejected,
+                "latency_ms": {"p50": ms(50), "p95": ms(95), "p99": ms(99)}
+            }
+
+
+class AgentGateway:
+    """ASGI application serving lambda_handler and lambda_handler_stream."""
+
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.metrics = GatewayMetrics()
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            # this process talks to the agent itself, whatever the environment says
+            agenthelper.gatewayUrl = None
+            # enough pooled connections for everything the workers can have in
+            # flight: a batch fans out to BATCH_CONCURRENCY questions and a
+            # hedged question adds a duplicate request
+            agenthelper.configure_transport(pool_maxsize=self.workers * agenthelper.BATCH_CONCURRENCY * 2)
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="agent-gateway")
+        return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                loop = asyncio.get_running_loop()
+                try:
+                    # pay for imports, the connection pool and credentials before the first request
+                    await loop.run_in_executor(self._get_executor(), agenthelper.init)
+                except Exception as e:
+                    print(f"Agent client init failed: {e}")
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        method = scope["method"]
+        path = scope["path"]
+        if method == "GET" and path == "/healthz":
+            await send_json(send, 200, {"ok": True})
+        elif method == "GET" and path == "/metrics":
+            await send_json(send, 200, self.stats())
+        elif method == "POST" and path in ("/invoke", "/stream"):
+            if self.metrics.in_flight >= self.max_pending:
+                self.metrics.reject()
+                await send_json(send, 503, {"error": "Agent gateway is at capacity"})
+                return
+            try:
+                event = json.loads(await read_body(receive) or b"{}")
+            except ValueError:
+                await send_json(send, 400, {"error": "Request body is not JSON"})
+                return
+            if not isinstance(event, dict) or (("sessionId" not in event or "question" not in event) and "questions" not in event):
+                await send_json(send, 400, {"error": "Expected a lambda_handler event with sessionId and question"})
+                return
+            if path == "/stream":
+                # checked before the 200 goes out; after that errors can only be events
+                try:
+                    if "sessionId" not in event or "question" not in event:
+                        raise ValueError("/stream answers one question: expected sessionId and question")
+                    agenthelper.check_event(event)
+                except ValueError as e:
+                    await send_json(send, 400, {"error": str(e)})
+                    return
+            self.metrics.begin(path)
+            start = time.perf_counter()
+            status = 500
+            try:
+                if path == "/invoke":
+                    status = await self._invoke(event, send)
+                else:
+                    status = await self._stream(event, receive, send)
+            finally:
+                self.metrics.end(status, time.perf_counter() - start)
+        else:
+            await send_json(send, 404, {"error": f"No route for {method} {path}"})
+
+    async def _invoke(self, event, send):
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(self._get_executor(), agenthelper.lambda_handler, event, None)
+        status = response["status_code"]
+        await send_raw(send, status, response["body"].encode("utf-8"))
+        return status
+
+    async def _stream(self, event, receive, send):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def push(name, data):
+            loop.call_soon_threadsafe(queue.put_nowait, (name, data))
+
+        class TraceForwarder(list):
+            # lambda_handler_stream appends trace parts as they are decoded
+            def append(self, item):
+                super().append(item)
+                push("trace", item)
+
+        def pump():
+            start = time.perf_counter()
+            deadline = None
+            stream = None
+            # whatever happens, the reader gets exactly one done or error event
+            last = ("error", {"status_code": 500, "error": "The agent stream stopped unexpectedly"})
+            try:
+                deadline = agenthelper.deadline_for(event)
+                stream = agenthelper.lambda_handler_stream(event, None, TraceForwarder())
+                for text in stream:
+                    if cancelled.is_set():
+                        break
+                    push("chunk", text)
+                last = ("done", {"elapsed_ms": round((time.perf_counter() - start) * 1000, 1)})
+            except Exception as e:
+                last = ("error", {"status_code": agenthelper.error_status(e, deadline), "error": str(e)})
+            finally:
+                try:
+                    if stream is not None:
+                        stream.close()
+                finally:
+                    push(*last)
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            cancelled.set()
+            # wakes the reader even while the agent has nothing new to send
+            queue.put_nowait(None)
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no")
+            ]
+        })
+        worker = loop.run_in_executor(self._get_executor(), pump)
+        watcher = asyncio.ensure_future(watch_disconnect())
+        status = 200
+        try:
+            while True:
+                item = await queue.get()
+                if item is None or cancelled.is_set():
+                    break
+                name, data = item
+                await send({"type": "http.response.body", "body": sse.encode(name, data), "more_body": True})
+                if name == "error":
+                    status = data["status_code"]
+                if name in ("done", "error"):
+                    break
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            cancelled.set()
+            watcher.cancel()
+            await worker
+        return status
+
+    def stats(self):
+        return {
+            "gateway": self.metrics.snapshot(),
+            "cache": agenthelper.answer_cache.stats(),
+            "inflight": agenthelper.inflight.stats(),
+            "sessions": agenthelper.sessions.stats(),
+            "hedging": agenthelper.hedger.stats(),
+            "response_lengths": agenthelper.usage_meter.stats(),
+            "regions": agenthelper.router.stats() if agenthelper.router is not None else None,
+            "rate_limits": rate_limit.stats()
+        }
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def send_raw(send, status, body, content_type=b"application/json"):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode("ascii"))]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status, data):
+    await send_raw(send, status, json.dumps(data).encode("utf-8"))
+
+
+app = AgentGateway()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP gateway in front of the Bedrock agent")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
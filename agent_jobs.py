@@ -0,0 +1,208 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+import singleflight
+
+# Agent calls off the Streamlit script thread. A question becomes an AgentJob
+# on a process-wide thread pool; the script stores the user's JobQueue in
+# st.session_state and polls it on each rerun, so the page stays responsive,
+# a rerun no longer kills the call, and users can queue more questions while
+# earlier ones run. Jobs of one queue run one at a time in the order they were
+# submitted, because they share an agent session; different users' queues run
+# in parallel.
+
+WORKERS = int(os.environ.get("AGENT_JOB_WORKERS", "16"))
+MAX_PENDING = int(os.environ.get("AGENT_JOB_MAX_PENDING", "10"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_executor = None
+_executor_lock = threading.Lock()
+_ids = itertools.count(1)
+
+
+def get_executor():
+    """The thread pool every JobQueue in the process runs on."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="agent-job")
+    return _executor
+
+
+class JobCancelled(singleflight.Cancelled):
+    """Raised inside a running job once it has been cancelled.
+
+    A singleflight.Cancelled, so when the job leads a coalesced request the
+    other callers waiting on it carry on without it.
+    """
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when max_pending jobs are already waiting or running."""
+
+
+class _CancellableTrace(list):
+    # trace parts arrive before and between answer chunks, so checking here
+    # stops a cancelled job well before its answer would have started
+    def __init__(self, job):
+        super().__init__()
+        self._job = job
+
+    def append(self, item):
+        if self._job.cancel_requested:
+            raise JobCancelled()
+        super().append(item)
+
+
+class AgentJob:
+    """One question and its progress; read from the script thread while a worker fills it in."""
+
+    def __init__(self, event):
+        self.id = next(_ids)
+        self.event = event
+        self.status = QUEUED
+        self.chunks = []
+        self.trace = _CancellableTrace(self)
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def question(self):
+        return self.event["question"]
+
+    @property
+    def text(self):
+        """The answer so far."""
+        return "".join(self.chunks)
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self):
+        """Seconds since submission, or from submission to the end once done."""
+        return (self.finished or time.time()) - self.submitted
+
+    def cancel(self):
+        """Stops the job: queued jobs never start, running ones stop at their next trace part or chunk."""
+        with self._lock:
+            self._cancel.set()
+            if self.status == QUEUED:
+                self.status = CANCELLED
+                self.finished = time.time()
+
+    def run(self, handler):
+        with self._lock:
+            if self.status != QUEUED:
+                # cancelled while it waited
+                return
+            self.status = RUNNING
+            self.started = time.time()
+        stream = None
+        try:
+            stream = handler(self.event, None, self.trace)
+            for text in stream:
+                if self.cancel_requested:
+                    raise JobCancelled()
+                self.chunks.append(text)
+            self.status = DONE
+        except Exception as e:
+            # another user's cancelled job can surface here through a shared
+            # (single-flight) call; only our own cancel makes this one cancelled
+            if isinstance(e, JobCancelled) and self.cancel_requested:
+                self.status = CANCELLED
+            else:
+                self.error = e
+                self.status = FAILED
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                # closing the generator hands back or drops its connection
+                stream.close()
+            self.finished = time.time()
+
+
+class JobQueue:
+    """One user's agent jobs: run in submission order on the shared pool, collected when done.
+
+    handler(event, context, trace) must return an iterator of answer text;
+    it defaults to invoke_agent.lambda_handler_stream.
+    """
+
+    def __init__(self, handler=None, max_pending=MAX_PENDING):
+        self.handler = handler
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._jobs = []  # every job not yet collected, in submission order
+        self._waiting = deque()
+        self._draining = False
+
+    def submit(self, event):
+        """Queues a lambda_handler_stream event and returns its AgentJob."""
+        with self._lock:
+            if sum(not job.done for job in self._jobs) >= self.max_pending:
+                raise QueueFull(f"Too many questions waiting for an answer (at most {self.max_pending})")
+            job = AgentJob(event)
+            self._jobs.append(job)
+            self._waiting.append(job)
+            start = not self._draining
+            self._draining = True
+        if start:
+            get_executor().submit(self._drain)
+        return job
+
+    def _drain(self):
+        if self.handler is None:
+            import invoke_agent
+            self.handler = invoke_agent.lambda_handler_stream
+        while True:
+            with self._lock:
+                if not self._waiting:
+                    self._draining = False
+                    return
+                job = self._waiting.popleft()
+            job.run(self.handler)
+
+    def pending(self):
+        """Jobs still queued or running, oldest first."""
+        with self._lock:
+            return [job for job in self._jobs if not job.done]
+
+    def collect(self):
+        """Removes and returns finished jobs, oldest first, up to the first unfinished one.
+
+        Stopping there keeps answers in the order the questions were asked.
+        """
+        with self._lock:
+            finished = []
+            while self._jobs and self._jobs[0].done:
+                finished.append(self._jobs.pop(0))
+            return finished
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            job.cancel()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._jobs)
@@ -0,0 +1,214 @@
+import json
+import time
+from array import array
+
+# Typed view of the trace parts InvokeAgent streams back with enableTrace.
+# AgentTrace keeps the raw parts plus the time each one arrived; parse_steps
+# pairs the input and output parts of each step (model call, knowledge-base
+# lookup, action group call) into TraceStep records so a request's latency
+# can be broken down by where the time went.
+
+STAGES = {
+    "preProcessingTrace": "pre_processing",
+    "orchestrationTrace": "orchestration",
+    "postProcessingTrace": "post_processing",
+}
+
+INVOCATION_KINDS = {
+    "KNOWLEDGE_BASE": "knowledge_base",
+    "ACTION_GROUP": "action_group",
+    "ACTION_GROUP_CODE_INTERPRETER": "code_interpreter",
+    "AGENT_COLLABORATOR": "agent_collaborator",
+}
+
+
+class AgentTrace:
+    """Trace events collected during one agent call.
+
+    Each call gets its own instance, so concurrent calls never share state.
+    Events are kept as parsed dicts next to an array of arrival times
+    (time.perf_counter seconds) and only rendered to text by str(), one JSON
+    document per line.
+    """
+
+    __slots__ = ("events", "times", "started", "first_chunk", "last_chunk", "finished")
+
+    def __init__(self):
+        self.events = []
+        self.times = array("d")
+        self.started = time.perf_counter()
+        self.first_chunk = None
+        self.last_chunk = None
+        self.finished = None
+
+    def append(self, trace):
+        self.events.append(trace)
+        self.times.append(time.perf_counter())
+
+    def chunk_received(self):
+        now = time.perf_counter()
+        if self.first_chunk is None:
+            self.first_chunk = now
+        self.last_chunk = now
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def steps(self):
+        return parse_steps(self.events, self.times, self.started)
+
+    def latency_breakdown(self):
+        return latency_breakdown(self)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def __len__(self):
+        return len(self.events)
+
+    def __str__(self):
+        return "".join(json.dumps(event) + "\n" for event in self.events)
+
+
+class TraceStep:
+    """One timed step of an agent request; start and end are perf_counter seconds."""
+
+    __slots__ = ("kind", "stage", "trace_id", "name", "start", "end", "input_tokens", "output_tokens")
+
+    def __init__(self, kind, stage, trace_id, name, start, end=None, input_tokens=0, output_tokens=0):
+        self.kind = kind
+        self.stage = stage
+        self.trace_id = trace_id
+        self.name = name
+        self.start = start
+        self.end = end
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else self.start) - self.start
+
+    def as_dict(self, origin=0.0):
+        return {
+            "kind": self.kind,
+            "stage": self.stage,
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 1),
+            "duration_ms": round(self.duration * 1000, 1),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+    def __repr__(self):
+        return f"TraceStep({self.kind!r}, {self.name!r}, {self.duration * 1000:.1f} ms)"
+
+
+def _usage(part):
+    usage = part.get("metadata", {}).get("usage", {})
+    return usage.get("inputTokens", 0) or 0, usage.get("outputTokens", 0) or 0
+
+
+def parse_steps(events, times, started=None):
+    """Pairs trace parts into TraceSteps, in the order the steps started.
+
+    A step runs from the arrival of its input part to the arrival of the
+    matching output part with the same traceId. Outputs without a recorded
+    input start at the previous event; inputs never answered end at the last one.
+    """
+    steps = []
+    open_steps = {}
+    previous = started if started is not None else (times[0] if times else 0.0)
+
+    for event, at in zip(events, times):
+        for key, part in event.items():
+            if not isinstance(part, dict):
+                continue
+            stage = STAGES.get(key)
+            if stage is None:
+                if key == "failureTrace":
+                    steps.append(TraceStep("failure", None, part.get("traceId"), part.get("failureReason"), previous, at))
+                elif key == "guardrailTrace":
+                    steps.append(TraceStep("guardrail", None, part.get("traceId"), part.get("action"), previous, at))
+                continue
+
+            model_input = part.get("modelInvocationInput")
+            if model_input is not None:
+                trace_id = model_input.get("traceId")
+                step = TraceStep("model", stage, trace_id, model_input.get("type"), at)
+                open_steps[("model", trace_id)] = step
+                steps.append(step)
+
+            model_output = part.get("modelInvocationOutput")
+            if model_output is not None:
+                trace_id = model_output.get("traceId")
+                step = open_steps.pop(("model", trace_id), None)
+                if step is None:
+                    step = TraceStep("model", stage, trace_id, None, previous)
+                    steps.append(step)
+                step.end = at
+                step.input_tokens, step.output_tokens = _usage(model_output)
+
+            invocation = part.get("invocationInput")
+            if invocation is not None:
+                invocation_type = invocation.get("invocationType")
+                kind = INVOCATION_KINDS.get(invocation_type)
+                if kind is not None:
+                    trace_id = invocation.get("traceId")
+                    details = invocation.get("actionGroupInvocationInput") or invocation.get("knowledgeBaseLookupInput") or {}
+                    name = details.get("actionGroupName") or details.get("knowledgeBaseId")
+                    step = TraceStep(kind, stage, trace_id, name, at)
+                    open_steps[(kind, trace_id)] = step
+                    steps.append(step)
+
+            observation = part.get("observation")
+            if observation is not None:
+                kind = INVOCATION_KINDS.get(observation.get("type"))
+                if kind is not None:
+                    trace_id = observation.get("traceId")
+                    step = open_steps.pop((kind, trace_id), None)
+                    if step is None:
+                        step = TraceStep(kind, stage, trace_id, None, previous)
+                        steps.append(step)
+                    step.end = at
+        previous = at
+
+    for step in open_steps.values():
+        step.end = previous
+    return steps
+
+
+def latency_breakdown(trace):
+    """Summarises where one request's time went, in milliseconds.
+
+    Returns total time (up to finish(), or the last event while still
+    running), time to the first trace event and first
+    answer chunk, time spent per step kind, token totals and the steps
+    themselves relative to the start of the request.
+    """
+    origin = trace.started
+    steps = trace.steps()
+    last = trace.finished
+    if last is None:
+        last = max(trace.times[-1] if len(trace.times) else origin, trace.last_chunk or origin)
+
+    by_kind = {}
+    input_tokens = output_tokens = 0
+    for step in steps:
+        by_kind[step.kind] = by_kind.get(step.kind, 0.0) + step.duration * 1000
+        input_tokens += step.input_tokens
+        output_tokens += step.output_tokens
+
+    def offset(value):
+        return round((value - origin) * 1000, 1) if value is not None else None
+
+    return {
+        "total_ms": offset(last),
+        "first_event_ms": offset(trace.times[0]) if len(trace.times) else None,
+        "first_chunk_ms": offset(trace.first_chunk),
+        "by_kind_ms": {kind: round(ms, 1) for kind, ms in by_kind.items()},
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "steps": [step.as_dict(origin) for step in steps],
+    }
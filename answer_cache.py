@@ -0,0 +1,166 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Two-tier cache for agent answers: a small in-process LRU in front of an
+# SQLite file shared by every process on the machine. Entries expire after
+# ttl seconds and each tier evicts its least recently used entries once it
+# holds more than its size limit. The disk tier is best effort: if the file
+# cannot be opened or a query fails, the error is logged and the lookup is a
+# miss, so a broken cache never fails a request.
+
+MEMORY_ENTRIES = int(os.environ.get("AGENT_CACHE_MEMORY_ENTRIES", "256"))
+DISK_ENTRIES = int(os.environ.get("AGENT_CACHE_DISK_ENTRIES", "10000"))
+TTL = float(os.environ.get("AGENT_CACHE_TTL", "3600"))
+# Set AGENT_CACHE_PATH to an empty string to keep the cache in memory only.
+# On Lambda only /tmp is writable, so the default file goes there.
+DEFAULT_PATH = "/tmp/answer_cache.sqlite" if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") else "answer_cache.sqlite"
+PATH = os.environ.get("AGENT_CACHE_PATH", DEFAULT_PATH)
+
+
+def normalize_question(question):
+    """Lower-cases, collapses whitespace and drops trailing punctuation."""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+class AnswerCache:
+    """Thread-safe LRU + SQLite cache of lambda_handler response bodies."""
+
+    def __init__(self, memory_entries=MEMORY_ENTRIES, disk_entries=DISK_ENTRIES, ttl=TTL, path=PATH):
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._db = None
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @staticmethod
+    def key(agent, alias, question, session=None, options=()):
+        """Cache key for a question to one agent alias, optionally scoped to a session.
+
+        options are settings that change the answer (length, language); each
+        combination gets its own entry, None standing for the default.
+        """
+        parts = [agent, alias, session or "", normalize_question(question)]
+        parts += ["" if option is None else str(option) for option in options]
+        raw = "\x1f".join(parts)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _connect(self):
+        # opened on first use so importing the cache never touches the disk
+        if self._db is None and self.path:
+            import sqlite3
+            try:
+                db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS answers ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed)")
+            except Exception as e:
+                # an unwritable directory will not fix itself; keep to the memory tier
+                print(f"Answer cache file {self.path} unavailable, caching in memory only: {e}")
+                self.errors += 1
+                self.path = None
+                return None
+            self._db = db
+        return self._db
+
+    def _disk_error(self, action, error):
+        # caller holds self._lock
+        self.errors += 1
+        print(f"Answer cache {action} failed: {error}")
+
+    def get(self, key):
+        """Returns the cached value or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            db = self._connect()
+            if db is not None:
+                try:
+                    row = db.execute("SELECT value, created FROM answers WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        value, created = row
+                        if now - created < self.ttl:
+                            db.execute("UPDATE answers SET accessed = ? WHERE key = ?", (now, key))
+                            self._remember(key, created, value)
+                            self.hits += 1
+                            self.disk_hits += 1
+                            return value
+                        db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                except Exception as e:
+                    self._disk_error("lookup", e)
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            db = self._connect()
+            if db is not None:
+                try:
+                    db.execute(
+                        "INSERT OR REPLACE INTO answers (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                        (key, value, now, now)
+                    )
+                    count = db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+                    if count > self.disk_entries:
+                        excess = count - self.disk_entries
+                        db.execute(
+                            "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY accessed LIMIT ?)",
+                            (excess,)
+                        )
+                        self.evictions += excess
+                except Exception as e:
+                    self._disk_error("store", e)
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            db = self._connect()
+            if db is not None:
+                try:
+                    db.execute("DELETE FROM answers")
+                except Exception as e:
+                    self._disk_error("clear", e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "memory_entries": len(self._memory)
+            }
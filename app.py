@@ -1,29 +1,10 @@
 import invoke_agent as agenthelper
+import app_core
 import streamlit as st
-import json
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-import os
-import boto3
-from PIL import Image, ImageOps, ImageDraw
 #import text_to_speech as tts
 #import translate_text as translate
 #import sentiment_analysis as sa
 
-
-# Access AWS credentials from Streamlit secrets
-aws_access_key_id = st.secrets["aws"]["access_key_id"]
-aws_secret_access_key = st.secrets["aws"]["secret_access_key"]
-
-# Initialize a boto3 session
-session = boto3.Session(
-    aws_access_key_id=aws_access_key_id,
-    aws_secret_access_key=aws_secret_access_key
-)
-
-credentials = session.get_credentials().get_frozen_credentials()
-
 # Streamlit page configuration
 st.set_page_config(
     page_title="MistralRAG AI Agent: Your Conversational Search Companion",
@@ -31,26 +12,6 @@ st.set_page_config(
     layout="wide"
 )
 
-# Function to crop image into a circle
-def crop_to_circle(image):
-    mask = Image.new('L', image.size, 0)
-    mask_draw = ImageDraw.Draw(mask)
-    mask_draw.ellipse((0, 0) + image.size, fill=255)
-    result = ImageOps.fit(image, mask.size, centering=(0.5, 0.5))
-    result.putalpha(mask)
-    return result
-
-# Function to parse and format response
-def format_response(response_body):
-    try:
-        data = json.loads(response_body)
-        if isinstance(data, list):
-            return pd.DataFrame(data)
-        else:
-            return response_body
-    except json.JSONDecodeError:
-        return response_body
-
 # Orchestration
 def main():
     st.title("MistralRAG AI Agent: Your Conversational Search Companion")
@@ -75,28 +36,25 @@ def main():
             #prompt = translate_text(prompt, "English")
 
         event = {
-            "sessionId": "MISTRAL_SESSION",
+            "sessionId": app_core.agent_session_id("MISTRAL_SESSION"),
             "question": prompt
         }
-        response = agenthelper.lambda_handler(event, None)
-
-        try:
-            if response and 'body' in response and response['body']:
-                response_data = json.loads(response['body'])
-                print("TRACE & RESPONSE DATA ->  ", response_data)
-            else:
-                print("Invalid or empty response received")
-        except json.JSONDecodeError as e:
-            print("JSON decoding error:", e)
-            response_data = None
-
+        # Render the answer as it streams in instead of waiting for all of it
+        trace = agenthelper.AgentTrace()
         try:
-            all_data = format_response(response_data['response'])
-            the_response = response_data['trace_data']
-        except:
+            the_response = st.write_stream(agenthelper.lambda_handler_stream(event, None, trace))
+            all_data = app_core.format_response(str(trace))
+        except Exception as e:
+            print("Agent error:", e)
             all_data = "..."
             the_response = "Apologies, but an error occurred. Please rerun the application"
 
+        # Where the seconds went: one row per model call, lookup and action group
+        if len(trace):
+            latency = agenthelper.latency_breakdown(trace)
+            st.sidebar.write(f"Total: {latency['total_ms']} ms, first token: {latency['first_chunk_ms']} ms")
+            st.sidebar.dataframe(latency["steps"])
+
         st.sidebar.text_area("Trace Data:", value=all_data, height=700)
         st.session_state['history'].append({"question": prompt, "answer": the_response})
         st.session_state['trace_data'] = the_response
@@ -119,41 +77,15 @@ def main():
 
     if end_session_button:
         st.session_state['history'].append({"question": "Session Ended", "answer": "Thank you for using MistralRAG AI Agent!"})
-        event = {
-            "sessionId": "MISTRAL_SESSION",
-            "question": "placeholder to end session",
-            "endSession": True
-        }
-        agenthelper.lambda_handler(event, None)
+        # ended in the background; the next question starts a new agent session
+        agenthelper.sessions.end(st.session_state.get('agent_session_key'))
         st.session_state['history'].clear()
 
     display_conversation_history()
     display_example_prompts()
 
 def display_conversation_history():
-    st.write("## Conversation History")
-
-    human_image = Image.open('human.png')
-    robot_image = Image.open('robot.png')
-    circular_human_image = crop_to_circle(human_image)
-    circular_robot_image = crop_to_circle(robot_image)
-
-    for index, chat in enumerate(reversed(st.session_state['history'])):
-        col1_q, col2_q = st.columns([1, 11])
-        with col1_q:
-            st.image(circular_human_image, width=60)
-        with col2_q:
-            st.text_area("You:", value=chat["question"], height=150, key=f"question_{index}", disabled=True)
-
-        col1_a, col2_a = st.columns([1, 11])
-        with col1_a:
-            st.image(circular_robot_image, width=60)
-        with col2_a:
-            if isinstance(chat["answer"], pd.DataFrame):
-                st.dataframe(chat["answer"], key=f"answer_df_{index}")
-
-            else:
-                st.text_area("MistralRAG AI Agent:", value=chat["answer"], height=250, key=f"answer_{index}", disabled=True)
+    app_core.display_conversation_history("MistralRAG AI Agent:")
 
 def display_example_prompts():
     st.write("## Example Prompts")
@@ -1,46 +1,40 @@
 import invoke_agent as agenthelper
+import app_core
 import streamlit as st
 import json
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-import os
-import boto3
-from PIL import Image, ImageOps, ImageDraw
 #import text_to_speech as tts
 #import translate_text as translate
 #import sentiment_analysis as sa
-from trulens.core import Feedback # type: ignore
-from trulens.core import TruSession
-from trulens.apps.langchain import TruChain
-from trulens.providers.bedrock import Bedrock
-
-# Access AWS credentials from Streamlit secrets
-aws_access_key_id = st.secrets["aws"]["access_key_id"]
-aws_secret_access_key = st.secrets["aws"]["secret_access_key"]
-
-# Initialize a boto3 session
-boto3_session = boto3.Session(
-    aws_access_key_id=aws_access_key_id,
-    aws_secret_access_key=aws_secret_access_key
-)
 
-# Initialize TruSession
-trulens_session = TruSession()
-trulens_session.reset_database()
+# The TruLens recorder and its Bedrock feedback provider are built on the
+# first question and then shared by every rerun and session in the process,
+# instead of at the top of every rerun. credentials is app_core.aws_fingerprint(),
+# so rotating the AWS secrets builds a new recorder on the new session.
+@st.cache_resource(max_entries=1)
+def tru_recorder(credentials):
+    trulens_core = app_core.load("trulens.core")
+    TruChain = app_core.load("trulens.apps.langchain").TruChain
+    Bedrock = app_core.load("trulens.providers.bedrock").Bedrock
 
-# Initialize Bedrock-based feedback provider class:
-bedrock = Bedrock(model_id="anthropic.claude-3-haiku-20240307-v1:0", region_name="us-east-1", boto3_session=boto3_session)
+    # boto3 session for the AWS credentials in the Streamlit secrets
+    boto3_session = app_core.aws_session()
 
-# Define a feedback function using the Bedrock provider.
-f_qa_relevance = Feedback(
-    bedrock.relevance_with_cot_reasons, name="Answer Relevance"
-).on_input_output()
+    # Initialize TruSession
+    trulens_session = trulens_core.TruSession()
+    trulens_session.reset_database()
 
-# Instrument chain for logging with TruLens
-tru_recorder = TruChain(
-    agenthelper.lambda_handler, app_name="MistralRAG_AI_Agent", feedbacks=[f_qa_relevance]
-)
+    # Initialize Bedrock-based feedback provider class:
+    bedrock = Bedrock(model_id="anthropic.claude-3-haiku-20240307-v1:0", region_name="us-east-1", boto3_session=boto3_session)
+
+    # Define a feedback function using the Bedrock provider.
+    f_qa_relevance = trulens_core.Feedback(
+        bedrock.relevance_with_cot_reasons, name="Answer Relevance"
+    ).on_input_output()
+
+    # Instrument chain for logging with TruLens
+    return TruChain(
+        agenthelper.lambda_handler, app_name="MistralRAG_AI_Agent", feedbacks=[f_qa_relevance]
+    )
 
 # Streamlit page configuration
 st.set_page_config(
@@ -49,26 +43,6 @@ st.set_page_config(
     layout="wide"
 )
 
-# Function to crop image into a circle
-def crop_to_circle(image):
-    mask = Image.new('L', image.size, 0)
-    mask_draw = ImageDraw.Draw(mask)
-    mask_draw.ellipse((0, 0) + image.size, fill=255)
-    result = ImageOps.fit(image, mask.size, centering=(0.5, 0.5))
-    result.putalpha(mask)
-    return result
-
-# Function to parse and format response
-def format_response(response_body):
-    try:
-        data = json.loads(response_body)
-        if isinstance(data, list):
-            return pd.DataFrame(data)
-        else:
-            return response_body
-    except json.JSONDecodeError:
-        return response_body
-
 # Orchestration
 def main():
     st.title("MistralRAG AI Agent: Your Conversational Search Companion")
@@ -93,11 +67,11 @@ def main():
             #prompt = translate_text(prompt, "English")
 
         event = {
-            "sessionId": "MISTRAL_SESSION",
+            "sessionId": app_core.agent_session_id("MISTRAL_SESSION"),
             "question": prompt
         }
 
-        with tru_recorder as recording:
+        with tru_recorder(app_core.aws_fingerprint()) as recording:
             response = agenthelper.lambda_handler(event, None)
 
         try:
@@ -111,7 +85,7 @@ def main():
             response_data = None
 
         try:
-            all_data = format_response(response_data['response'])
+            all_data = app_core.format_response(response_data['response'])
             the_response = response_data['trace_data']
         except:
             all_data = "..."
@@ -140,41 +114,20 @@ def main():
     if end_session_button:
         st.session_state['history'].append({"question": "Session Ended", "answer": "Thank you for using MistralRAG AI Agent!"})
         event = {
-            "sessionId": "MISTRAL_SESSION",
+            "sessionId": app_core.agent_session_id("MISTRAL_SESSION"),
             "question": "placeholder to end session",
             "endSession": True
         }
-        with tru_recorder as recording:
+        with tru_recorder(app_core.aws_fingerprint()) as recording:
             agenthelper.lambda_handler(event, None)
+        agenthelper.sessions.discard(st.session_state.get('agent_session_key'))
         st.session_state['history'].clear()
 
     display_conversation_history()
     display_example_prompts()
 
 def display_conversation_history():
-    st.write("## Conversation History")
-
-    human_image = Image.open('human.png')
-    robot_image = Image.open('robot.png')
-    circular_human_image = crop_to_circle(human_image)
-    circular_robot_image = crop_to_circle(robot_image)
-
-    for index, chat in enumerate(reversed(st.session_state['history'])):
-        col1_q, col2_q = st.columns([1, 11])
-        with col1_q:
-            st.image(circular_human_image, width=60)
-        with col2_q:
-            st.text_area("You:", value=chat["question"], height=150, key=f"question_{index}", disabled=True)
-
-        col1_a, col2_a = st.columns([1, 11])
-        with col1_a:
-            st.image(circular_robot_image, width=60)
-        with col2_a:
-            if isinstance(chat["answer"], pd.DataFrame):
-                st.dataframe(chat["answer"], key=f"answer_df_{index}")
-
-            else:
-                st.text_area("MistralRAG AI Agent:", value=chat["answer"], height=250, key=f"answer_{index}", disabled=True)
+    app_core.display_conversation_history("MistralRAG AI Agent:")
 
 def display_example_prompts():
     st.write("## Example Prompts")
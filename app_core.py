@@ -0,0 +1,319 @@
+import importlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+import avatar_assets
+import aws_resources
+import history_window
+
+# What the Streamlit front-ends (app*.py, docunexus*.py) share. Importing this
+# module is cheap on purpose: pandas, boto3, requests, PIL,
+# snowflake.connector, trulens and friends are only imported by load(), the
+# first time a feature actually needs them, and then stay in sys.modules for
+# every later rerun and session in the process. A cold session that never
+# uploads a CSV or runs a Snowflake query never pays for those imports.
+#
+#   pd = app_core.load("pandas")
+
+DOCUSIGN_BASE_URL = os.environ.get("DOCUSIGN_BASE_URL", "https://demo.docusign.net/restapi")
+# page stylesheets; images they use live in static/, which Streamlit serves at
+# ./app/static/ with server.enableStaticServing (see .streamlit/config.toml)
+STYLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "styles")
+
+_modules = {}
+_lock = threading.Lock()
+# module name -> ms its first import took, for the sidebar or a benchmark
+import_ms = {}
+_styles = {}  # stylesheet path -> (mtime, <style> element)
+
+
+def load(name):
+    """The module called name, imported on first use and then cached."""
+    module = _modules.get(name)
+    if module is None:
+        with _lock:
+            module = _modules.get(name)
+            if module is None:
+                start = time.perf_counter()
+                module = importlib.import_module(name)
+                import_ms[name] = round((time.perf_counter() - start) * 1000, 1)
+                _modules[name] = module
+    return module
+
+
+def is_dataframe(value):
+    # nothing can be a DataFrame before pandas has been imported, so there is
+    # no need to import it just to check
+    pandas = sys.modules.get("pandas")
+    return pandas is not None and isinstance(value, pandas.DataFrame)
+
+
+def format_response(response_body):
+    """A DataFrame when the body is a JSON list, otherwise the body unchanged."""
+    try:
+        data = json.loads(response_body)
+    except json.JSONDecodeError:
+        return response_body
+    if isinstance(data, list):
+        return load("pandas").DataFrame(data)
+    return response_body
+
+
+def minify_css(css):
+    """css without comments and without the whitespace a browser ignores."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    return re.sub(r":\s+", ":", css).strip()
+
+
+def page_style(name):
+    """Puts the stylesheet styles/name on the page.
+
+    Streamlit drops anything a rerun does not draw again, so the style has to
+    go out with every rerun; serving the .css from static/ is no way around
+    that, as Streamlit serves .css files there as text/plain. Instead the file
+    is read and minified once per process (again if it changes on disk) and
+    every rerun sends the cached element. Images stay out of the CSS and are
+    fetched from static/ once, then cached by the browser.
+    """
+    import streamlit as st
+
+    path = os.path.join(STYLES_DIR, name)
+    mtime = os.path.getmtime(path)
+    cached = _styles.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding="utf-8") as f:
+            cached = (mtime, f"<style>{minify_css(f.read())}</style>")
+        _styles[path] = cached
+    st.markdown(cached[1], unsafe_allow_html=True)
+
+
+def aws_credentials():
+    """boto3 keyword arguments for the [aws] Streamlit secrets."""
+    import streamlit as st
+
+    return {
+        "aws_access_key_id": st.secrets["aws"]["access_key_id"],
+        "aws_secret_access_key": st.secrets["aws"]["secret_access_key"]
+    }
+
+
+def aws_session():
+    """The process-wide boto3 session for the [aws] secrets, rebuilt when they change."""
+    return aws_resources.session(**aws_credentials())
+
+
+def aws_client(service_name, region_name=None):
+    """The process-wide boto3 client for the [aws] secrets, rebuilt when they change."""
+    return aws_resources.client(service_name, region_name=region_name, **aws_credentials())
+
+
+def aws_fingerprint():
+    """Changes when the [aws] secrets do; a cache key for resources built on aws_session()."""
+    return aws_resources.fingerprint(**aws_credentials())
+
+
+# Each browser session talks to its own agent session; the key lives in
+# st.session_state and the agent session ID behind it is renewed after idling
+def agent_session_id(prefix):
+    import streamlit as st
+    import invoke_agent
+
+    if 'agent_session_key' not in st.session_state:
+        st.session_state['agent_session_key'] = invoke_agent.sessions.new_key()
+    return invoke_agent.sessions.session_id(st.session_state['agent_session_key'], prefix)
+
+
+# Agent calls run on agent_jobs' shared thread pool, not on the script's
+# thread; each browser session queues its questions in st.session_state
+def agent_job_queue():
+    import streamlit as st
+    import agent_jobs
+
+    if 'agent_jobs' not in st.session_state:
+        st.session_state['agent_jobs'] = agent_jobs.JobQueue()
+    return st.session_state['agent_jobs']
+
+
+def show_agent_jobs(error_answer=None):
+    """The questions still queued or running, each with a Cancel button.
+
+    Drawn as a fragment that polls once a second while there are any. Finished
+    answers go into the history and the page is rerun. A failed question is
+    queued in st.session_state['agent_errors'] for the page to show, or, with
+    error_answer, answered with error_answer in the history instead.
+    """
+    import streamlit as st
+
+    run_every = 1.0 if agent_job_queue().pending() else None
+    st.fragment(run_every=run_every)(agent_jobs_panel)(error_answer)
+
+
+def agent_jobs_panel(error_answer=None):
+    import streamlit as st
+    import agent_jobs
+
+    queue = agent_job_queue()
+    finished = queue.collect()
+    for job in finished:
+        if job.status == agent_jobs.FAILED:
+            print("Agent error:", job.error)
+            if error_answer is None:
+                st.session_state.setdefault('agent_errors', []).append(f"Error processing response: {job.error}")
+                continue
+            st.session_state['trace_text'] = "..."
+            answer = error_answer
+        elif job.status == agent_jobs.DONE:
+            st.session_state['trace_text'] = format_response("\n".join(json.dumps(t) for t in job.trace))
+            answer = job.text
+        else:
+            continue
+        st.session_state['history'].append({"question": job.question, "answer": answer})
+        st.session_state['trace_data'] = answer
+    if finished:
+        # redraw the whole page with the new answers
+        st.rerun()
+
+    for job in queue.pending():
+        with st.container(border=True):
+            state = "Queued" if job.status == agent_jobs.QUEUED else "Answering"
+            st.caption(f"⏳ {state} ({job.elapsed:.0f}s): {job.question}")
+            if job.text:
+                st.markdown(job.text)
+            if st.button("Cancel", key=f"cancel_job_{job.id}"):
+                job.cancel()
+
+
+def display_conversation_history(answer_label, title="## Conversation History", avatar_sizes=(60, 60), heights=(150, 250)):
+    """The chat history, newest first, with the human and robot avatars.
+
+    avatar_sizes and heights are (question, answer) pairs in pixels.
+    """
+    import streamlit as st
+
+    st.write(title)
+
+    # rendered once per process and size, then shared by every rerun and row
+    human_size, robot_size = avatar_sizes
+    human_avatar = avatar_assets.circular_avatar('human.png', human_size)
+    robot_avatar = avatar_assets.circular_avatar('robot.png', robot_size)
+    question_height, answer_height = heights
+
+    def show_turn(index, chat):
+        col1_q, col2_q = st.columns([1, 11])
+        with col1_q:
+            st.image(human_avatar, width=human_size)
+        with col2_q:
+            st.text_area("You:", value=chat["question"], height=question_height, key=f"question_{index}", disabled=True)
+
+        col1_a, col2_a = st.columns([1, 11])
+        with col1_a:
+            st.image(robot_avatar, width=robot_size)
+        with col2_a:
+            if is_dataframe(chat["answer"]):
+                st.dataframe(chat["answer"], key=f"answer_df_{index}")
+            else:
+                st.text_area(answer_label, value=chat["answer"], height=answer_height, key=f"answer_{index}", disabled=True)
+
+    # only the latest turns are live widgets; older ones are paged in on request
+    history_window.render(st.session_state['history'], show_turn)
+
+
+def send_to_docusign(document, recipient_email, recipient_name):
+    """Sends a PDF out for signature and returns DocuSign's response.
+
+    document is a path or an uploaded file. Needs api_key and account_id
+    under [docusign] in the Streamlit secrets.
+    """
+    import base64
+    import streamlit as st
+
+    requests = load("requests")
+    if hasattr(document, "getvalue"):
+        content = document.getvalue()
+    else:
+        with open(document, "rb") as f:
+            content = f.read()
+
+    docusign = st.secrets["docusign"]
+    headers = {
+        "Authorization": f"Bearer {docusign['api_key']}",
+        "Content-Type": "application/json"
+    }
+
+    envelope_definition = {
+        "emailSubject": "Please sign this document",
+        "documents": [
+            {
+                "documentId": "1",
+                "name": "document.pdf",
+                "fileExtension": "pdf",
+                "documentBase64": base64.b64encode(content).decode()
+            }
+        ],
+        "recipients": {
+            "signers": [
+                {
+                    "email": recipient_email,
+                    "name": recipient_name,
+                    "recipientId": "1",
+                    "tabs": {
+                        "signHereTabs": [
+                            {
+                                "documentId": "1",
+                                "pageNumber": "1",
+                                "xPosition": "100",
+                                "yPosition": "100"
+                            }
+                        ]
+                    }
+                }
+            ]
+        },
+        "status": "sent"
+    }
+
+    response = requests.post(f"{DOCUSIGN_BASE_URL}/v2.1/accounts/{docusign['account_id']}/envelopes", headers=headers, json=envelope_definition)
+    return response.json()
+
+
+def connect_to_snowflake():
+    """A connection from the [snowflake] Streamlit secrets, or None after showing the error."""
+    import streamlit as st
+
+    try:
+        connector = load("snowflake.connector")
+        return connector.connect(
+            user=st.secrets["snowflake"]["user"],
+            password=st.secrets["snowflake"]["password"],
+            account=st.secrets["snowflake"]["account"],
+            warehouse=st.secrets["snowflake"]["warehouse"],
+            database=st.secrets["snowflake"]["database"],
+            schema=st.secrets["snowflake"]["schema"]
+        )
+    except Exception as e:
+        st.error(f"Error connecting to Snowflake: {e}")
+        return None
+
+
+def execute_snowflake_query(query):
+    """All rows of query, or None after showing the error."""
+    import streamlit as st
+
+    con = connect_to_snowflake()
+    if con is None:
+        return None
+    try:
+        cur = con.cursor()
+        cur.execute(query)
+        return cur.fetchall()
+    except Exception as e:
+        st.error(f"Error executing query: {e}")
+        return None
+    finally:
+        con.close()
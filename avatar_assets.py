@@ -0,0 +1,64 @@
+import io
+import os
+import threading
+
+# Circular chat avatars for display_conversation_history. Opening the image,
+# masking it and encoding it again on every Streamlit rerun is wasted work,
+# so each (image, display size) pair is rendered once per process and the PNG
+# bytes are shared by every session and every history row. Identical bytes
+# also let Streamlit serve one media file for all the rows.
+#
+#   st.image(avatar_assets.circular_avatar('human.png', 60), width=60)
+
+# rendered at twice the display size so the avatars stay sharp on high-DPI screens
+SCALE = 2
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def crop_to_circle(image):
+    """The image fitted to a square with everything outside the inscribed circle transparent."""
+    from PIL import Image, ImageDraw, ImageOps
+
+    side = min(image.size)
+    # the mask is drawn large and scaled down, which smooths the circle's edge
+    mask = Image.new('L', (side * 4, side * 4), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0) + mask.size, fill=255)
+    mask = mask.resize((side, side), Image.LANCZOS)
+    result = ImageOps.fit(image.convert('RGBA'), (side, side), centering=(0.5, 0.5))
+    result.putalpha(mask)
+    return result
+
+
+def render(path, size):
+    """PNG bytes of the circular avatar for path, size pixels across at SCALE."""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        circle = crop_to_circle(image)
+    pixels = size * SCALE
+    if circle.size != (pixels, pixels):
+        circle = circle.resize((pixels, pixels), Image.LANCZOS)
+    buffer = io.BytesIO()
+    circle.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def circular_avatar(path, size):
+    """Cached PNG bytes of the circular avatar for path at a display size in pixels.
+
+    Re-rendered only when the file on disk changes.
+    """
+    key = (os.path.abspath(path), size, os.path.getmtime(path))
+    data = _cache.get(key)
+    if data is None:
+        with _lock:
+            data = _cache.get(key)
+            if data is None:
+                data = render(path, size)
+                # drop renderings of an older version of the same file
+                for old in [k for k in _cache if k[:2] == key[:2]]:
+                    del _cache[old]
+                _cache[key] = data
+    return data
@@ -0,0 +1,98 @@
+import hashlib
+import threading
+
+# Process-wide boto3 sessions and clients. A boto3.Session loads botocore's
+# data files and resolves credentials, and each client built from it loads a
+# service model, so building them at the top of a Streamlit script (every
+# rerun) or per request costs tens of milliseconds each time for nothing.
+# Here each profile keeps one session, plus one client per service and
+# region, for the life of the process.
+#
+# Sessions are keyed by a fingerprint of the credentials they were built
+# with. When a profile is asked for with different credentials (a rotated key
+# in st.secrets, say) its old session and clients are dropped and rebuilt.
+# Sessions on the default credential chain pick up refreshed temporary
+# credentials on their own; clear() forces everything to be rebuilt.
+#
+#   bedrock = aws_resources.client("bedrock-runtime", region_name="us-east-1")
+
+
+class _Profile:
+    def __init__(self, key, session):
+        self.key = key
+        self.session = session
+        self.clients = {}  # (service_name, region_name) -> client
+
+
+_profiles = {}  # profile name (None for the default) -> _Profile
+# boto3 sessions are not safe to build clients from in several threads at once
+_lock = threading.Lock()
+_created = {"sessions": 0, "clients": 0, "invalidations": 0}
+
+
+def fingerprint(aws_access_key_id=None, aws_secret_access_key=None, aws_session_token=None):
+    """A short digest of a credential set, or None for the default chain.
+
+    Used as the cache key so the secrets themselves are not kept around as keys.
+    """
+    if not (aws_access_key_id or aws_secret_access_key or aws_session_token):
+        return None
+    material = "\0".join(value or "" for value in (aws_access_key_id, aws_secret_access_key, aws_session_token))
+    return hashlib.sha256(material.encode()).hexdigest()[:16]
+
+
+def _profile(aws_access_key_id, aws_secret_access_key, aws_session_token, profile_name):
+    # caller holds _lock
+    key = fingerprint(aws_access_key_id, aws_secret_access_key, aws_session_token)
+    profile = _profiles.get(profile_name)
+    if profile is None or profile.key != key:
+        import boto3
+
+        if profile is not None:
+            _created["invalidations"] += 1
+        session = boto3.Session(
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            aws_session_token=aws_session_token,
+            profile_name=profile_name
+        )
+        profile = _Profile(key, session)
+        _profiles[profile_name] = profile
+        _created["sessions"] += 1
+    return profile
+
+
+def session(aws_access_key_id=None, aws_secret_access_key=None, aws_session_token=None, profile_name=None):
+    """The process-wide boto3.Session for a profile, rebuilt when its credentials change.
+
+    Without credentials the session uses the default chain (environment,
+    shared config, instance role). Regions are chosen per client.
+    """
+    with _lock:
+        return _profile(aws_access_key_id, aws_secret_access_key, aws_session_token, profile_name).session
+
+
+def client(service_name, region_name=None, aws_access_key_id=None, aws_secret_access_key=None,
+           aws_session_token=None, profile_name=None):
+    """The process-wide boto3 client for a service and region. Clients are thread-safe."""
+    with _lock:
+        profile = _profile(aws_access_key_id, aws_secret_access_key, aws_session_token, profile_name)
+        key = (service_name, region_name)
+        service_client = profile.clients.get(key)
+        if service_client is None:
+            service_client = profile.session.client(service_name, region_name=region_name)
+            profile.clients[key] = service_client
+            _created["clients"] += 1
+        return service_client
+
+
+def clear():
+    """Drops every cached session and client; the next call builds them again."""
+    with _lock:
+        _created["invalidations"] += len(_profiles)
+        _profiles.clear()
+
+
+def stats():
+    with _lock:
+        return dict(_created, profiles=len(_profiles), cached_clients=sum(len(p.clients) for p in _profiles.values()))
@@ -0,0 +1,129 @@
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+# Import cost of the Streamlit front-ends. Streamlit runs an app's module-level
+# code on every session's first run and on every rerun; the imports in it are
+# only paid once per process, but a cold process pays all of them before the
+# first page renders. Each app's module-level imports are run in a fresh
+# interpreter:
+#
+#   python benchmarks/app_startup.py
+#   python benchmarks/app_startup.py --rev HEAD~1   # the apps as of a commit
+#
+# streamlit itself is left out, since the server has it loaded already.
+# Fails when an app's imports load a module that should only load on first
+# use through app_core.load(). Modules that are not installed here are listed
+# and skipped, so their cost is missing from the totals.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APPS = ["app.py", "app2.py", "app3.py", "app4.py", "docunexus.py", "docunexus2.py", "docunexus3.py"]
+# loaded by app_core.load() when a feature needs them, never at startup
+DEFERRED_MODULES = ["matplotlib", "numpy", "pandas", "boto3", "botocore", "requests", "PIL",
+                    "snowflake.connector", "trulens"]
+
+MEASURE = """
+import json, sys, time
+missing = []
+start = time.perf_counter()
+for statement in {statements!r}:
+    try:
+        exec(statement)
+    except ImportError as e:
+        missing.append(e.name or statement)
+import_ms = (time.perf_counter() - start) * 1000
+loaded = [name for name in {deferred!r} if name in sys.modules]
+print(json.dumps({{"import_ms": import_ms, "loaded": loaded, "missing": missing}}))
+"""
+
+FIRST_USE = """
+import json, app_core
+app_core.load({name!r})
+print(json.dumps(app_core.import_ms))
+"""
+
+
+def run_python(code, env):
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+
+
+def app_source(app, rev=None):
+    if rev is None:
+        with open(os.path.join(ROOT, app), encoding="utf-8") as f:
+            return f.read()
+    return subprocess.run(["git", "show", f"{rev}:{app}"], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+
+
+def import_statements(source):
+    """The module-level import statements of an app, streamlit's left out."""
+    statements = []
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = [node.module or ""]
+        else:
+            continue
+        if all(name.split(".")[0] == "streamlit" for name in names):
+            continue
+        statements.append(ast.unparse(node))
+    return statements
+
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Module-level import cost of the Streamlit apps")
+    parser.add_argument("--rev", help="measure the apps as of this git revision instead of the working tree")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to take the median of")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    env.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    env["AGENT_CACHE_PATH"] = ""
+    env["PYTHONPATH"] = ROOT
+
+    failures = []
+    missing = set()
+    for app in APPS:
+        code = MEASURE.format(statements=import_statements(app_source(app, args.rev)), deferred=DEFERRED_MODULES)
+        samples = []
+        for _ in range(args.runs):
+            result = run_python(code, env)
+            if result.returncode != 0:
+                sys.exit(f"{app}: {result.stderr.strip()}")
+            samples.append(json.loads(result.stdout))
+        loaded = samples[0]["loaded"]
+        missing.update(samples[0]["missing"])
+        print(f"{app:<15} {median([s['import_ms'] for s in samples]):8.1f} ms  loads: {', '.join(loaded) or '-'}")
+        if loaded:
+            failures.append(f"{app} imports deferred modules at startup: {', '.join(loaded)}")
+
+    # what the same modules cost when a feature first needs them
+    print("first use through app_core.load():")
+    for name in DEFERRED_MODULES:
+        result = run_python(FIRST_USE.format(name=name), env)
+        if result.returncode == 0:
+            print(f"  {name:<20} {json.loads(result.stdout)[name]:8.1f} ms")
+        else:
+            print(f"  {name:<20} not installed")
+    if missing:
+        print(f"not installed, left out of the totals: {', '.join(sorted(missing))}")
+
+    if failures:
+        print("Over budget:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("Within budget")
+
+
+if __name__ == "__main__":
+    main()
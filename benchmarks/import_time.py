@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Cold-start budget check for the Lambda handler module. Each measurement runs
+# in a fresh interpreter, as a Lambda cold start would:
+#
+#   python benchmarks/import_time.py
+#
+# Fails when `import invoke_agent` takes longer than --import-budget ms, when
+# it pulls in any of the modules that should only load on first use, or when
+# init() (the warm-up work) takes longer than --init-budget ms.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET_MS = 60
+INIT_BUDGET_MS = 1000
+# loaded by init() or on first use, never by the import itself
+DEFERRED_MODULES = ["boto3", "botocore", "requests", "urllib3", "sqlite3", "asyncio", "concurrent.futures", "cassette"]
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import invoke_agent
+import_ms = (time.perf_counter() - start) * 1000
+loaded = [name for name in {deferred!r} if name in sys.modules]
+start = time.perf_counter()
+timings = invoke_agent.init()
+init_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"import_ms": import_ms, "loaded": loaded, "init_ms": init_ms, "init": timings}}))
+"""
+
+
+def run_python(args, env):
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def slowest_imports(env, count=10):
+    """Top modules by cumulative time from python -X importtime."""
+    result = run_python(["-X", "importtime", "-c", "import invoke_agent"], env)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self [us] | cumulative | imported package"
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        if name.strip() == "site":
+            # everything so far was interpreter start-up
+            rows = []
+            continue
+        rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import and init time budgets for invoke_agent")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_MS, help="ms allowed for import invoke_agent")
+    parser.add_argument("--init-budget", type=float, default=INIT_BUDGET_MS, help="ms allowed for invoke_agent.init()")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to take the median of")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    env.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    env["AGENT_CACHE_PATH"] = ""
+    env.pop("AGENT_EAGER_INIT", None)
+    env.pop("AGENT_CASSETTE", None)
+
+    samples = [
+        json.loads(run_python(["-c", MEASURE.format(deferred=DEFERRED_MODULES)], env).stdout)
+        for _ in range(args.runs)
+    ]
+    import_ms = sorted(sample["import_ms"] for sample in samples)[len(samples) // 2]
+    init_ms = sorted(sample["init_ms"] for sample in samples)[len(samples) // 2]
+    loaded = samples[0]["loaded"]
+
+    print(f"import invoke_agent   {import_ms:8.1f} ms  (budget {args.import_budget:.0f} ms)")
+    print(f"invoke_agent.init()   {init_ms:8.1f} ms  (budget {args.init_budget:.0f} ms)  {samples[0]['init']}")
+    print("slowest imports (cumulative):")
+    for cumulative_us, name in slowest_imports(env):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if import_ms > args.import_budget:
+        failures.append(f"import took {import_ms:.1f} ms, budget {args.import_budget:.0f} ms")
+    if init_ms > args.init_budget:
+        failures.append(f"init() took {init_ms:.1f} ms, budget {args.init_budget:.0f} ms")
+    if loaded:
+        failures.append(f"import loaded deferred modules: {', '.join(loaded)}")
+    if failures:
+        print("Over budget:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("Within budget")
+
+
+if __name__ == "__main__":
+    main()
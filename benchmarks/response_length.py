@@ -0,0 +1,87 @@
+import argparse
+import contextlib
+import io
+import os
+import socket
+import sys
+
+# Measures what each responseLength setting costs: answer output tokens
+# against the setting's ceiling, and end-to-end latency. Runs against the
+# configured agent (AGENT_ENDPOINT_URL or Bedrock), or with --mock against a
+# local mock_agent_server that follows the word budget:
+#
+#   python benchmarks/response_length.py --mock
+#   python benchmarks/response_length.py --runs 5 --question "Summarise the Q3 contract"
+#
+# Exits with status 1 when a setting's p95 answer tokens exceed its ceiling.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# answers must come from the agent, not from an earlier run's disk cache
+os.environ["AGENT_CACHE_PATH"] = ""
+
+QUESTION = "Give me an overview of the documents in the knowledge base."
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Output tokens and latency per responseLength")
+    parser.add_argument("--runs", type=int, default=10, help="calls per setting")
+    parser.add_argument("--question", default=QUESTION)
+    parser.add_argument("--language", default=None, help="also ask for an answer in this language")
+    parser.add_argument("--mock", action="store_true", help="run against a local mock agent")
+    args = parser.parse_args()
+
+    import invoke_agent
+    import response_options
+
+    if args.mock:
+        import mock_agent_server
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+        port = free_port()
+        # long enough that every setting's budget actually cuts the answer short
+        mock_agent_server.serve(port=port, config=mock_agent_server.MockAgentConfig(answer_bytes=16384, first_chunk_delay=0.05))
+        invoke_agent.endpointUrl = f"http://127.0.0.1:{port}"
+        invoke_agent.rate_limit.configure(invoke_agent.agentAliasId, max_rate=1e9, burst=1e9)
+    invoke_agent.gatewayUrl = None
+
+    for length in response_options.CEILINGS:
+        for run in range(args.runs):
+            event = {
+                "sessionId": f"bench-{length}-{run}",
+                "question": args.question,
+                "responseLength": length,
+                # a fresh session per call, which also keeps the answer cache out of it
+                "endSession": True
+            }
+            if args.language:
+                event["language"] = args.language
+            with contextlib.redirect_stdout(io.StringIO()):
+                response = invoke_agent.lambda_handler(event, None)
+            if response["status_code"] != 200:
+                sys.exit(f"{length}: {response['body']}")
+
+    results = invoke_agent.usage_meter.stats()
+    print(f"{'setting':8} {'ceiling':>8} {'tokens p50':>11} {'tokens p95':>11} {'over':>5} {'latency p50':>12}")
+    failures = []
+    for length, row in results.items():
+        print(f"{length:8} {str(row['ceiling']):>8} {row['output_tokens_p50']:>11} {row['output_tokens_p95']:>11} "
+              f"{row['over_ceiling']:>5} {row['latency_ms_p50']:>9.1f} ms")
+        if row["ceiling"] is not None and row["output_tokens_p95"] > row["ceiling"]:
+            failures.append(f"{length}: p95 of {row['output_tokens_p95']} tokens is over its ceiling of {row['ceiling']}")
+    if failures:
+        print("Over ceiling:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
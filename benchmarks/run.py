@@ -0,0 +1,226 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Benchmarks for the agent response path: decoding the event stream, formatting
+# the trace for the sidebar, the lambda_handler JSON round trip and SigV4
+# signing. Reports p50/p99 latency, throughput and peak traced memory per
+# stream size and compares them with the stored baselines.
+#
+#   python benchmarks/run.py                   # compare with benchmarks/baselines.json
+#   python benchmarks/run.py --quick           # streams up to 1 MB only
+#   python benchmarks/run.py --save            # record new baselines on this machine
+#
+# Exits with status 1 when a p50 or peak memory is worse than its baseline by
+# more than --tolerance. Baselines are machine-specific; re-record them with
+# --save when the benchmark machine changes.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# no answer cache on disk, no AWS credential lookup
+os.environ.setdefault("AGENT_CACHE_PATH", "")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+from botocore.credentials import Credentials  # noqa: E402
+
+import app_core  # noqa: E402
+import invoke_agent  # noqa: E402
+import rate_limit  # noqa: E402
+from benchmarks import synthetic  # noqa: E402
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+KB = 1024
+MB = 1024 * KB
+SIZES = [1 * KB, 64 * KB, 1 * MB, 10 * MB, 50 * MB]
+QUICK_SIZES = [1 * KB, 64 * KB, 1 * MB]
+# roughly how many stream bytes each benchmark works through per size
+BYTE_BUDGET = 200 * MB
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def measure(fn, size, min_runs=5, max_runs=200):
+    """Times fn() repeatedly, then once more under tracemalloc for peak memory."""
+    runs = max(min_runs, min(max_runs, BYTE_BUDGET // max(size, 1)))
+    fn()  # warm up
+    samples = []
+    gc.collect()
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    p50 = percentile(samples, 50)
+    return {
+        "runs": runs,
+        "p50_ms": round(p50 * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "throughput_mb_s": round(size / MB / p50, 1) if p50 > 0 else None,
+        "peak_mb": round(peak / MB, 2)
+    }
+
+
+def bench_decode_response(data):
+    def run():
+        invoke_agent.decode_response(synthetic.BytesResponse(data))
+    return run
+
+
+def bench_format_response(body):
+    def run():
+        app_core.format_response(body)
+    return run
+
+
+def bench_lambda_round_trip(data, cassette_path):
+    # endSession skips the answer cache and single-flight, so every call decodes
+    event = {"sessionId": "bench", "question": "benchmark question", "endSession": "true"}
+    url = invoke_agent.agent_url(event["sessionId"])
+    synthetic.write_cassette(cassette_path, data, url, invoke_agent.question_body(event["question"], True))
+    # replayed as fast as possible, over and over, without the client-side rate limit
+    invoke_agent.use_cassette(cassette_path, "replay", speed=0)
+    rate_limit.configure(invoke_agent.agentAliasId, max_rate=1e9, burst=1e9)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = invoke_agent.lambda_handler(event, None)
+        if response["status_code"] != 200:
+            raise RuntimeError(response["body"])
+        json.loads(response["body"])
+    return run
+
+
+def bench_sign_request(body):
+    credentials = Credentials("benchmark", "benchmark")
+    url = invoke_agent.agent_url("bench")
+
+    def run():
+        invoke_agent.sign_request(
+            url,
+            method="POST",
+            service="bedrock",
+            headers=invoke_agent.QUESTION_HEADERS,
+            region=invoke_agent.theRegion,
+            body=body,
+            credentials=credentials
+        )
+    return run
+
+
+def label(size):
+    return f"{size // MB}MB" if size >= MB else f"{size // KB}KB"
+
+
+def run_all(sizes, only=None):
+    results = {}
+
+    def record(name, tag, nbytes, fn):
+        if only and not any(pattern in name for pattern in only):
+            return
+        key = f"{name}@{tag}"
+        results[key] = measure(fn, nbytes)
+        report(key, results[key])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cassette_path = os.path.join(tmp, "bench.jsonl.gz")
+        for size in sizes:
+            data, _ = synthetic.agent_stream(size)
+            record("decode_response", label(size), len(data), bench_decode_response(data))
+            # only a JSON list becomes a DataFrame; any other body is returned as it is
+            body = synthetic.json_rows(size)
+            record("format_response", label(size), len(body), bench_format_response(body))
+            record("lambda_handler", label(size), len(data), bench_lambda_round_trip(data, cassette_path))
+        invoke_agent.use_cassette(None)
+
+    # signing hashes the request body; questions are capped at 2000 characters
+    for length in (100, 2000):
+        body = invoke_agent.question_body("q" * length)
+        record("sign_request", f"{length}chars", len(body), bench_sign_request(body))
+    return results
+
+
+def report(key, result):
+    throughput = result["throughput_mb_s"]
+    print(f"{key:<32} runs={result['runs']:<4} p50={result['p50_ms']:>10.3f} ms  p99={result['p99_ms']:>10.3f} ms  "
+          f"{throughput if throughput is not None else '-':>8} MB/s  peak={result['peak_mb']:>8.2f} MB")
+
+
+def compare(results, baselines, tolerance):
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+        for metric in ("p50_ms", "peak_mb"):
+            # ignore noise on values too small to matter
+            floor = 0.05 if metric == "p50_ms" else 0.5
+            if result[metric] > max(baseline[metric], floor) * (1 + tolerance):
+                regressions.append(f"{key} {metric}: {result[metric]} vs baseline {baseline[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the agent response path")
+    parser.add_argument("--quick", action="store_true", help="only streams up to 1 MB")
+    parser.add_argument("--only", action="append", help="run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing, 0.25 = 25%%")
+    parser.add_argument("--baselines", default=BASELINES)
+    args = parser.parse_args()
+
+    results = run_all(QUICK_SIZES if args.quick else SIZES, args.only)
+
+    if args.save:
+        stored = {}
+        if os.path.exists(args.baselines):
+            with open(args.baselines) as f:
+                stored = json.load(f).get("results", {})
+        stored.update(results)
+        with open(args.baselines, "w") as f:
+            json.dump({
+                "machine": {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.machine()},
+                "results": stored
+            }, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved {len(results)} baselines to {args.baselines}")
+        return
+
+    if not os.path.exists(args.baselines):
+        print("No baselines stored yet; run with --save to record them")
+        return
+    with open(args.baselines) as f:
+        baselines = json.load(f)["results"]
+    regressions = compare(results, baselines, args.tolerance)
+    if regressions:
+        print("Regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("No regressions against the stored baselines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import base64
+import gzip
+import json
+
+import mock_agent_server
+
+# Synthetic InvokeAgent responses for the benchmarks, built from the same
+# frames the local stand-in server sends.
+
+FINAL_RESPONSE_LIMIT = 1024 * 1024
+
+
+def agent_stream(size, chunk_bytes=1024, trace_steps=4):
+    """Returns (raw event-stream bytes of roughly size bytes, answer text).
+
+    The answer is sent as chunk events (base64, so 4/3 of its size) and again
+    as the trace's finalResponse, which is cut at FINAL_RESPONSE_LIMIT so the
+    trace frame stays under the event-stream message size limit.
+    """
+    if size / 2.4 <= FINAL_RESPONSE_LIMIT:
+        answer_bytes = max(1, int(size / 2.4))
+    else:
+        answer_bytes = int((size - FINAL_RESPONSE_LIMIT) * 3 / 4)
+    config = mock_agent_server.MockAgentConfig(answer_bytes=answer_bytes, chunk_bytes=chunk_bytes, trace_steps=trace_steps)
+    answer = mock_agent_server.make_answer(answer_bytes)
+    frames = [
+        mock_agent_server.trace_frame("BENCHAGENT", "BENCHALIAS", "bench", part)
+        for part in mock_agent_server.trace_parts(config, "benchmark question", answer[:FINAL_RESPONSE_LIMIT])
+    ]
+    data = answer.encode("utf-8")
+    for start in range(0, len(data), chunk_bytes):
+        frames.append(mock_agent_server.chunk_frame(data[start:start + chunk_bytes]))
+    return b"".join(frames), answer
+
+
+def json_rows(size):
+    """A JSON list of about size bytes of flat records, like a tabular agent answer."""
+    rows = []
+    total = 2
+    while total < size:
+        i = len(rows)
+        row = {"id": i, "account": f"ACCT-{i:08d}", "region": ("us-east-1", "us-west-2", "eu-west-1")[i % 3],
+               "amount": round(i * 1.37, 2), "status": "signed" if i % 4 else "pending"}
+        rows.append(row)
+        total += len(json.dumps(row)) + 2
+    return json.dumps(rows)
+
+
+class BytesResponse:
+    """Streaming response over bytes already in memory, read the way requests reads a socket."""
+
+    def __init__(self, data, read_size=64 * 1024):
+        self.data = data
+        self.read_size = read_size
+        self.status_code = 200
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        data = self.data
+        step = self.read_size
+        for start in range(0, len(data), step):
+            yield data[start:start + step]
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def write_cassette(path, data, url, body, read_size=64 * 1024):
+    """Writes a one-exchange cassette answering the POST of body to url with data."""
+    chunks = [
+        [0.0, base64.b64encode(data[start:start + read_size]).decode("ascii")]
+        for start in range(0, len(data), read_size)
+    ]
+    exchange = {
+        "request": {"method": "POST", "url": url, "headers": {}, "body": body},
+        "response": {"status": 200, "headers": {}, "headers_at": 0.0, "chunks": chunks}
+    }
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(exchange) + "\n")
@@ -0,0 +1,235 @@
+import base64
+import gzip
+import json
+import os
+import re
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Record/replay of raw agent HTTP exchanges for repeatable performance runs.
+#
+# In record mode every request sent through invoke_agent.sigv4_request is
+# written to a gzip-compressed cassette (one JSON document per line): the
+# signed request metadata with the access key and signature redacted, the
+# response status and headers, and the raw event-stream bytes exactly as they arrived, each stamped
+# with its offset from the moment the request was sent. In replay mode the
+# same requests are answered from the cassette without credentials or network,
+# with the original timing divided by speed (speed 0 replays as fast as possible).
+#
+#   AGENT_CASSETTE=traffic.jsonl.gz AGENT_CASSETTE_MODE=record streamlit run app.py
+#   AGENT_CASSETTE=traffic.jsonl.gz AGENT_CASSETTE_MODE=replay AGENT_CASSETTE_SPEED=10 python load_test.py
+
+PATH = os.environ.get("AGENT_CASSETTE")
+MODE = os.environ.get("AGENT_CASSETTE_MODE", "replay")
+SPEED = float(os.environ.get("AGENT_CASSETTE_SPEED", "1"))
+
+SESSION_PATTERN = re.compile(r"/sessions/[^/]+/")
+SIGNATURE_PATTERN = re.compile(r"Signature=[0-9a-f]+")
+ACCESS_KEY_PATTERN = re.compile(r"Credential=[^/]+/")
+SECRET_HEADERS = {"x-amz-security-token"}
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when no recorded exchange matches a request."""
+
+
+def _text(data):
+    if data is None:
+        return None
+    if isinstance(data, bytes):
+        return data.decode("utf-8")
+    return data
+
+
+def request_key(method, url, body):
+    """What replay matches on: method, URL with the session ID masked, and the question."""
+    path = SESSION_PATTERN.sub("/sessions/*/", url)
+    try:
+        payload = json.loads(body) if body else {}
+    except ValueError:
+        return method, path, body
+    streaming = bool(payload.get("streamingConfigurations", {}).get("streamFinalResponse"))
+    return method, path, payload.get("inputText"), payload.get("endSession"), streaming
+
+
+def redact_headers(headers):
+    redacted = {}
+    for name, value in headers.items():
+        if name.lower() in SECRET_HEADERS:
+            continue
+        value = _text(value)
+        if name.lower() == "authorization":
+            value = SIGNATURE_PATTERN.sub("Signature=REDACTED", value)
+            value = ACCESS_KEY_PATTERN.sub("Credential=REDACTED/", value)
+        redacted[name] = value
+    return redacted
+
+
+class RecordingResponse:
+    """Wraps a streaming requests.Response and records the bytes read from it.
+
+    The exchange is written to the cassette when the response is closed.
+    """
+
+    def __init__(self, cassette, response, request, started):
+        self._cassette = cassette
+        self._response = response
+        self._request = request
+        self._started = started
+        self._chunks = []
+        self._saved = False
+        self.headers_at = time.perf_counter() - started
+        if response.status_code >= 400:
+            # error bodies are small JSON documents; keep them whole
+            self._chunks.append((self.headers_at, response.content))
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for data in self._response.iter_content(chunk_size=chunk_size):
+            if data:
+                self._chunks.append((time.perf_counter() - self._started, data))
+            yield data
+
+    def close(self):
+        self._response.close()
+        if not self._saved:
+            self._saved = True
+            self._cassette.save({
+                "request": self._request,
+                "response": {
+                    "status": self._response.status_code,
+                    "headers": dict(self._response.headers),
+                    "headers_at": round(self.headers_at, 6),
+                    "chunks": [[round(at, 6), base64.b64encode(data).decode("ascii")] for at, data in self._chunks]
+                }
+            })
+
+
+class ReplayResponse:
+    """Stands in for a streaming requests.Response, serving a recorded exchange."""
+
+    def __init__(self, exchange, url, speed=1.0):
+        recorded = exchange["response"]
+        self.status_code = recorded["status"]
+        self.headers = CaseInsensitiveDict(recorded["headers"])
+        self.url = url
+        self.reason = None
+        self._chunks = recorded["chunks"]
+        self._headers_at = recorded.get("headers_at", 0.0)
+        self._speed = speed
+        self._started = time.perf_counter()
+        self._wait(self._headers_at)
+
+    def _wait(self, at):
+        # at is the recorded offset from sending the request
+        if self._speed > 0:
+            remaining = self._started + at / self._speed - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        # recorded chunk boundaries are kept so replays are byte-for-byte identical
+        for at, data in self._chunks:
+            self._wait(at)
+            yield base64.b64decode(data)
+
+    @property
+    def content(self):
+        return b"".join(base64.b64decode(data) for _, data in self._chunks)
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} replayed error for url: {self.url}", response=self)
+
+    def close(self):
+        pass
+
+
+class Cassette:
+    """A cassette file opened for recording or replay.
+
+    When replaying, exchanges with the same request_key are handed out in the
+    order they were recorded and, if repeat is set, start over once used up, so
+    a short recording can drive a longer load run.
+    """
+
+    def __init__(self, path, mode="replay", speed=1.0, repeat=True):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.repeat = repeat
+        self._lock = threading.Lock()
+        self._exchanges = {}
+        self._positions = {}
+        self.recorded = 0
+        self.replayed = 0
+        if mode == "replay":
+            self._load()
+
+    def _load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    exchange = json.loads(line)
+                    request = exchange["request"]
+                    key = request_key(request["method"], request["url"], request["body"])
+                    self._exchanges.setdefault(key, []).append(exchange)
+
+    def __len__(self):
+        return sum(len(exchanges) for exchanges in self._exchanges.values())
+
+    def record(self, send, method, url, headers, body):
+        """Calls send() and returns its response wrapped to record what is read from it."""
+        request = {
+            "method": method,
+            "url": url,
+            "headers": redact_headers(headers),
+            "body": _text(body)
+        }
+        started = time.perf_counter()
+        return RecordingResponse(self, send(), request, started)
+
+    def save(self, exchange):
+        line = json.dumps(exchange, separators=(",", ":")) + "\n"
+        with self._lock:
+            # each write is its own gzip member, so an interrupted run keeps what it saved
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+            self.recorded += 1
+
+    def play(self, method, url, body):
+        """Returns a ReplayResponse for the next recorded exchange matching the request."""
+        key = request_key(method, url, _text(body))
+        with self._lock:
+            exchanges = self._exchanges.get(key)
+            if not exchanges:
+                raise CassetteMiss(f"No recorded exchange for {method} {url}")
+            position = self._positions.get(key, 0)
+            if position >= len(exchanges):
+                if not self.repeat:
+                    raise CassetteMiss(f"Recorded exchanges for {method} {url} are used up")
+                position = 0
+            self._positions[key] = position + 1
+            self.replayed += 1
+        return ReplayResponse(exchanges[position], url, self.speed)
+
+
+def from_env():
+    """The cassette configured by AGENT_CASSETTE, or None."""
+    if not PATH:
+        return None
+    return Cassette(PATH, MODE, SPEED)
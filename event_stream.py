@@ -0,0 +1,235 @@
+import base64
+import codecs
+import json
+import struct
+from collections import namedtuple
+from zlib import crc32
+
+# Binary framing used by bedrock-agent-runtime (application/vnd.amazon.eventstream).
+# Every message is laid out as:
+#   prelude:  total length (4) | headers length (4) | prelude crc (4)
+#   headers:  name length (1) | name | value type (1) | value ...
+#   payload
+#   message crc (4)
+
+PRELUDE_LENGTH = 12
+CRC_LENGTH = 4
+MIN_MESSAGE_LENGTH = PRELUDE_LENGTH + CRC_LENGTH
+# The service caps a single message at 16 MiB of payload and 128 KiB of headers,
+# so anything bigger than this is a corrupt prelude, not a message to wait for.
+MAX_MESSAGE_LENGTH = 16 * 1024 * 1024 + 128 * 1024 + MIN_MESSAGE_LENGTH
+
+# Bytes pulled from the socket per read. HTTP chunked responses are still
+# handed over as soon as each chunk lands, so this does not delay the first event.
+CHUNK_SIZE = 64 * 1024
+
+_prelude = struct.Struct(">III")
+_uint32 = struct.Struct(">I")
+
+Message = namedtuple("Message", ["headers", "payload"])
+
+# Typed events produced from the agent completion stream
+Chunk = namedtuple("Chunk", ["text", "attribution"])
+Trace = namedtuple("Trace", ["trace"])
+
+
+class EventStreamError(Exception):
+    """Raised when the stream is corrupt or the service sends an exception message."""
+
+    def __init__(self, message, error_type=None, payload=None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.payload = payload
+
+
+def _encode_headers(headers):
+    parts = []
+    for name, value in headers.items():
+        name = name.encode("utf-8")
+        parts.append(bytes([len(name)]))
+        parts.append(name)
+        if value is True or value is False:
+            parts.append(bytes([0 if value else 1]))
+        elif isinstance(value, int):
+            parts.append(struct.pack(">Bi", 4, value))
+        elif isinstance(value, bytes):
+            parts.append(struct.pack(">BH", 6, len(value)))
+            parts.append(value)
+        else:
+            value = str(value).encode("utf-8")
+            parts.append(struct.pack(">BH", 7, len(value)))
+            parts.append(value)
+    return b"".join(parts)
+
+
+def encode_message(headers, payload):
+    """Builds one event-stream frame; the inverse of EventStreamDecoder.feed."""
+    header_bytes = _encode_headers(headers)
+    total_length = PRELUDE_LENGTH + len(header_bytes) + len(payload) + CRC_LENGTH
+    prelude = struct.pack(">II", total_length, len(header_bytes))
+    prelude += _uint32.pack(crc32(prelude))
+    message = prelude + header_bytes + payload
+    return message + _uint32.pack(crc32(message))
+
+
+def _decode_headers(data):
+    headers = {}
+    pos = 0
+    end = len(data)
+    while pos < end:
+        name_length = data[pos]
+        pos += 1
+        name = bytes(data[pos:pos + name_length]).decode("utf-8")
+        pos += name_length
+        value_type = data[pos]
+        pos += 1
+        if value_type == 0:
+            value = True
+        elif value_type == 1:
+            value = False
+        elif value_type == 2:
+            value = struct.unpack_from(">b", data, pos)[0]
+            pos += 1
+        elif value_type == 3:
+            value = struct.unpack_from(">h", data, pos)[0]
+            pos += 2
+        elif value_type == 4:
+            value = struct.unpack_from(">i", data, pos)[0]
+            pos += 4
+        elif value_type in (5, 8):
+            # 8 is a timestamp in epoch milliseconds, kept as the raw integer
+            value = struct.unpack_from(">q", data, pos)[0]
+            pos += 8
+        elif value_type in (6, 7):
+            length = struct.unpack_from(">H", data, pos)[0]
+            pos += 2
+            value = bytes(data[pos:pos + length])
+            if value_type == 7:
+                value = value.decode("utf-8")
+            pos += length
+        elif value_type == 9:
+            value = bytes(data[pos:pos + 16])
+            pos += 16
+        else:
+            raise EventStreamError(f"Unknown header value type {value_type} for {name}")
+        headers[name] = value
+    if pos != end:
+        raise EventStreamError("Header block overruns its declared length")
+    return headers
+
+
+class EventStreamDecoder:
+    """Incremental decoder for AWS event-stream frames.
+
+    Feed it raw bytes in whatever sizes the transport delivers and it yields
+    each complete Message exactly once. Only the current partial frame is
+    buffered, so memory stays bounded by the largest single message.
+    """
+
+    def __init__(self, max_message_length=MAX_MESSAGE_LENGTH):
+        self.max_message_length = max_message_length
+        self._buffer = bytearray()
+        self._start = 0
+
+    def feed(self, data):
+        buffer = self._buffer
+        # Drop frames consumed by the previous call in one go so each byte is
+        # only moved once, however the caller splits its reads
+        if self._start:
+            del buffer[:self._start]
+            self._start = 0
+        buffer += data
+        start = 0
+        available = len(buffer)
+
+        while available >= PRELUDE_LENGTH:
+            total_length, headers_length, prelude_crc = _prelude.unpack_from(buffer, start)
+            if crc32(buffer[start:start + 8]) != prelude_crc:
+                raise EventStreamError("Prelude checksum mismatch")
+            if total_length < MIN_MESSAGE_LENGTH or total_length > self.max_message_length:
+                raise EventStreamError(f"Invalid message length {total_length}")
+            if headers_length > total_length - MIN_MESSAGE_LENGTH:
+                raise EventStreamError(f"Invalid headers length {headers_length}")
+            if available < total_length:
+                break
+
+            end = start + total_length
+            with memoryview(buffer) as view:
+                message_crc = _uint32.unpack_from(view, end - CRC_LENGTH)[0]
+                if crc32(view[start:end - CRC_LENGTH]) != message_crc:
+                    raise EventStreamError("Message checksum mismatch")
+                headers_start = start + PRELUDE_LENGTH
+                payload_start = headers_start + headers_length
+                headers = _decode_headers(bytes(view[headers_start:payload_start]))
+                payload = bytes(view[payload_start:end - CRC_LENGTH])
+
+            start = end
+            available -= total_length
+            self._start = start
+            yield Message(headers, payload)
+
+    def close(self):
+        if len(self._buffer) - self._start:
+            raise EventStreamError("Stream ended in the middle of a message")
+
+
+def iter_messages(response, chunk_size=CHUNK_SIZE):
+    """Yields decoded event-stream Messages from a streaming requests.Response."""
+    decoder = EventStreamDecoder()
+    for data in response.iter_content(chunk_size=chunk_size):
+        if data:
+            yield from decoder.feed(data)
+    decoder.close()
+
+
+class AgentEventDecoder:
+    """Turns raw InvokeAgent response bytes into Chunk and Trace events.
+
+    Chunk text is decoded incrementally so multi-byte characters split between
+    two chunks come out intact. Exception messages raise EventStreamError.
+    """
+
+    def __init__(self):
+        self._frames = EventStreamDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def feed(self, data):
+        for message in self._frames.feed(data):
+            event = self._event(message)
+            if event is not None:
+                yield event
+
+    def close(self):
+        """Checks the stream ended cleanly and returns any events still pending."""
+        self._frames.close()
+        tail = self._text.decode(b"", final=True)
+        return [Chunk(tail, None)] if tail else []
+
+    def _event(self, message):
+        message_type = message.headers.get(":message-type", "event")
+        if message_type != "event":
+            error_type = message.headers.get(":exception-type") or message.headers.get(":error-code")
+            try:
+                detail = json.loads(message.payload).get("message", "")
+            except (ValueError, AttributeError):
+                detail = message.payload.decode("utf-8", "replace")
+            raise EventStreamError(f"{error_type}: {detail}", error_type, message.payload)
+
+        event_type = message.headers.get(":event-type")
+        if event_type == "chunk":
+            body = json.loads(message.payload)
+            text = self._text.decode(base64.b64decode(body.get("bytes", "")))
+            if text:
+                return Chunk(text, body.get("attribution"))
+        elif event_type == "trace":
+            return Trace(json.loads(message.payload).get("trace", {}))
+        return None
+
+
+def iter_events(response, chunk_size=CHUNK_SIZE):
+    """Yields Chunk and Trace events from a bedrock-agent-runtime InvokeAgent response."""
+    decoder = AgentEventDecoder()
+    for data in response.iter_content(chunk_size=chunk_size):
+        if data:
+            yield from decoder.feed(data)
+    yield from decoder.close()
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Hedged requests: when a call has taken longer than most calls do (the p95
+# of recent latencies by default), send a duplicate and use whichever answer
+# comes back first. The slow tail is usually one unlucky request, so the
+# duplicate often wins; capping hedges at max_ratio of all calls keeps the
+# extra load on the agent small.
+
+PERCENTILE = float(os.environ.get("AGENT_HEDGE_PERCENTILE", "95"))
+MIN_SAMPLES = int(os.environ.get("AGENT_HEDGE_MIN_SAMPLES", "20"))
+MAX_RATIO = float(os.environ.get("AGENT_HEDGE_MAX_RATIO", "0.1"))
+WORKERS = int(os.environ.get("AGENT_HEDGE_WORKERS", "32"))
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies in seconds."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct, min_samples=1):
+        """The pct-th percentile of the window, or None with fewer than min_samples."""
+        with self._lock:
+            if len(self._samples) < max(min_samples, 1):
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+        return ordered[index]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class Hedger:
+    """Runs calls with an optional hedge after a delay learnt from their latencies."""
+
+    def __init__(self, percentile=PERCENTILE, min_samples=MIN_SAMPLES, max_ratio=MAX_RATIO, workers=WORKERS, window=200):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.workers = workers
+        self.latencies = LatencyTracker(window)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def delay(self):
+        """Seconds to wait before hedging, or None until enough latencies are known."""
+        return self.latencies.percentile(self.percentile, self.min_samples)
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="agent-hedge")
+        return self._executor
+
+    def _may_hedge(self):
+        # caller holds self._lock; the call being decided on is already counted,
+        # and hedging it must keep hedged / calls within max_ratio, so the first
+        # calls of a cold process are never hedged
+        return self.hedged + 1 <= self.max_ratio * self.calls
+
+    def run(self, primary, hedge, delay=None):
+        """Returns primary(), or hedge() if that succeeds first after delay seconds.
+
+        delay defaults to the tracked percentile; with no delay known the call
+        is not hedged. An error from whichever finishes first only counts if
+        the other one fails too. The losing call runs to completion in the
+        background and its result is dropped.
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+        from concurrent.futures import TimeoutError as FutureTimeout
+
+        if delay is None:
+            delay = self.delay()
+        with self._lock:
+            self.calls += 1
+        start = time.perf_counter()
+        if delay is None:
+            result = primary()
+            self.latencies.observe(time.perf_counter() - start)
+            return result
+
+        first = self._get_executor().submit(primary)
+        try:
+            result = first.result(timeout=delay)
+        except FutureTimeout:
+            pass
+        else:
+            self.latencies.observe(time.perf_counter() - start)
+            return result
+
+        with self._lock:
+            if not self._may_hedge():
+                hedge = None
+            else:
+                self.hedged += 1
+        if hedge is None:
+            result = first.result()
+            self.latencies.observe(time.perf_counter() - start)
+            return result
+
+        second = self._get_executor().submit(hedge)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.latencies.observe(time.perf_counter() - start)
+                    if future is second:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "delay_ms": round(self.delay() * 1000, 1) if len(self.latencies) >= self.min_samples else None
+            }
@@ -0,0 +1,46 @@
+import os
+
+# Windowed rendering for display_conversation_history. Every turn shown costs
+# columns, images and text areas on each Streamlit rerun, so only the most
+# recent `window` turns are live widgets. Older turns are split into pages of
+# `page_size`, and only the page picked in the "Earlier turns" selector is
+# rendered. A rerun therefore draws at most window + page_size turns, however
+# long the session runs.
+
+WINDOW = int(os.environ.get("HISTORY_WINDOW", "10"))
+PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", "10"))
+HIDDEN = "Hidden"
+
+
+def page_ranges(count, page_size=PAGE_SIZE):
+    """(start, end) index ranges of pages over the first count turns, newest page first.
+
+    Pages are counted from the first turn, so a page keeps its turns and
+    label as the conversation grows; only the newest one fills up.
+    """
+    page_size = max(1, page_size)
+    return [(start, min(start + page_size, count)) for start in range(0, count, page_size)][::-1]
+
+
+def render(history, show_turn, window=WINDOW, page_size=PAGE_SIZE, key="history"):
+    """Calls show_turn(index, turn) for the recent window and the selected older page, newest first.
+
+    index is the turn's position in history, so widget keys built from it
+    stay the same from one rerun to the next.
+    """
+    import streamlit as st
+
+    recent_start = max(0, len(history) - max(0, window))
+    for index in range(len(history) - 1, recent_start - 1, -1):
+        show_turn(index, history[index])
+
+    pages = page_ranges(recent_start, page_size)
+    if not pages:
+        return
+    labels = [f"Turns {start + 1}-{end}" for start, end in pages]
+    choice = st.selectbox(f"Earlier turns ({recent_start})", [HIDDEN] + labels, key=f"{key}_page")
+    if choice == HIDDEN:
+        return
+    start, end = pages[labels.index(choice)]
+    for index in range(end - 1, start - 1, -1):
+        show_turn(index, history[index])
@@ -1,13 +1,21 @@
-from boto3.session import Session
-from botocore.auth import SigV4Auth
-from botocore.awsrequest import AWSRequest
-from botocore.credentials import Credentials
 import json
 import os
-from requests import request
-import base64
-import io
-import sys
+import threading
+import time
+import uuid
+import event_stream
+from answer_cache import AnswerCache
+import rate_limit
+import singleflight
+from session_manager import SessionManager
+from hedging import Hedger
+from agent_trace import AgentTrace
+import response_options
+import region_router
+
+# botocore, requests and the thread pool are imported where they are first
+# used, so importing this module (a Lambda cold start) stays cheap; init()
+# pays for them up front when there is time to, see lambda_handler's warm-up.
 
 #For this to run on a local machine in VScode, you need to set the AWS_PROFILE environment variable to the name of the profile/credentials you want to use. 
 
@@ -19,10 +27,209 @@ import sys
 agentId = "TUEIMWJPG4" #INPUT YOUR AGENT ID HERE
 agentAliasId = "P9IYL6HBXN" #INPUT YOUR ALIAS ID HERE
 theRegion = "us-east-1"
+# Point the client at another endpoint, e.g. the local stand-in from
+# mock_agent_server.py: AGENT_ENDPOINT_URL=http://127.0.0.1:8900
+endpointUrl = os.environ.get("AGENT_ENDPOINT_URL")
+# Send lambda_handler and lambda_handler_stream events to an agent_gateway.py
+# service instead of calling the agent from this process, e.g.
+# AGENT_GATEWAY_URL=http://127.0.0.1:8080
+gatewayUrl = os.environ.get("AGENT_GATEWAY_URL")
+
+region = os.environ.get("AWS_REGION", theRegion)
+
+# Keep-alive connection pool shared by every caller in the process, Streamlit
+# sessions included, so the TCP+TLS handshake is only paid once per connection.
+# pool_connections is how many distinct hosts keep a pool and pool_maxsize how
+# many connections per host are kept for reuse; past it extra connections are
+# opened and closed after use. pool_block makes callers wait for a free pooled
+# connection instead, with no limit on the wait (not even the request
+# deadline), so it is off unless AGENT_POOL_BLOCK=true.
+POOL_CONNECTIONS = int(os.environ.get("AGENT_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.environ.get("AGENT_POOL_MAXSIZE", "32"))
+POOL_BLOCK = os.environ.get("AGENT_POOL_BLOCK", "false").lower() == "true"
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def configure_transport(pool_connections=None, pool_maxsize=None, pool_block=None):
+    """Replaces the shared connection pool, e.g. to size it for a worker pool.
+
+    Requests already in flight finish on the old pool.
+    """
+    global POOL_CONNECTIONS, POOL_MAXSIZE, POOL_BLOCK, _http_session
+    with _http_session_lock:
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if pool_block is not None:
+            POOL_BLOCK = pool_block
+        _http_session = None
+
+
+def get_http_session():
+    """Returns the process-wide requests.Session used for agent calls."""
+    global _http_session
+    session = _http_session
+    if session is None:
+        with _http_session_lock:
+            session = _http_session
+            if session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_CONNECTIONS,
+                    pool_maxsize=POOL_MAXSIZE,
+                    pool_block=POOL_BLOCK
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _http_session = session
+    return session
+
+
+class CredentialCache:
+    """Resolves AWS credentials on first use and keeps them fresh.
+
+    Credentials are looked up through the default AWS chain the first time a
+    request is signed rather than at import. Temporary (STS, SSO, instance role)
+    credentials are refreshed on a background timer refresh_ahead seconds
+    before they expire, so signing only ever blocks on the very first lookup
+    or if a background refresh fell behind.
+    """
+
+    def __init__(self, resolver=None, refresh_ahead=300, retry_interval=30):
+        self._resolver = resolver or self._default_resolver
+        self.refresh_ahead = refresh_ahead
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._frozen = None
+        self._expiry = None
+        self._timer = None
+
+    @staticmethod
+    def _default_resolver():
+        # botocore's session walks the same chain as boto3's without importing boto3
+        from botocore.session import get_session
+        credentials = get_session().get_credentials()
+        if credentials is None:
+            raise RuntimeError("No AWS credentials found; set AWS_PROFILE or the AWS_* environment variables")
+        return credentials
+
+    @property
+    def resolved(self):
+        """True once get() can answer without a blocking lookup."""
+        expiry = self._expiry
+        return self._frozen is not None and (expiry is None or time.time() < expiry)
+
+    def get(self):
+        """Returns frozen credentials suitable for SigV4Auth."""
+        frozen = self._frozen
+        expiry = self._expiry
+        if frozen is None or (expiry is not None and time.time() >= expiry):
+            with self._lock:
+                if self._frozen is None or (self._expiry is not None and time.time() >= self._expiry):
+                    self._refresh()
+                frozen = self._frozen
+        return frozen
+
+    def invalidate(self):
+        """Forgets cached credentials so the next get() resolves them again."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._credentials = None
+            self._frozen = None
+            self._expiry = None
+            self._timer = None
+
+    def _refresh(self):
+        if self._credentials is None:
+            self._credentials = self._resolver()
+        # refreshable botocore credentials renew themselves here when close to expiry
+        self._frozen = self._credentials.get_frozen_credentials()
+        expiry_time = getattr(self._credentials, "_expiry_time", None)
+        self._expiry = expiry_time.timestamp() if expiry_time is not None else None
+        self._schedule()
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._expiry is None:
+            return
+        delay = max(self._expiry - self.refresh_ahead - time.time(), self.retry_interval)
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            try:
+                self._refresh()
+            except Exception as e:
+                # keep serving the current credentials and try again shortly
+                print(f"Credential refresh failed: {e}")
+                self._timer = threading.Timer(self.retry_interval, self._background_refresh)
+                self._timer.daemon = True
+                self._timer.start()
+
+
+# Shared by every caller in the process
+credential_cache = CredentialCache()
+
+
+def use_cassette(path=None, mode="replay", speed=1.0, repeat=True):
+    """Records agent traffic to, or replays it from, a cassette file; no path turns it off."""
+    global _cassette
+    if path:
+        import cassette
+        _cassette = cassette.Cassette(path, mode, speed, repeat)
+    else:
+        _cassette = None
+    return _cassette
+
+
+# Record/replay of agent traffic, see cassette.py; set AGENT_CASSETTE or call use_cassette()
+_cassette = None
+if os.environ.get("AGENT_CASSETTE"):
+    import cassette
+    _cassette = cassette.from_env()
+
+
+def sign_request(
+    url,
+    method='GET',
+    body=None,
+    params=None,
+    headers=None,
+    service='execute-api',
+    region=None,
+    credentials=None
+):
+    """Signs a request with SigV4 and returns the prepared request (method, url, headers, body).
+
+    Takes the same arguments as sigv4_request; shared with the asyncio client.
+    """
+    from botocore.auth import SigV4Auth
+    from botocore.awsrequest import AWSRequest
+
+    if credentials is None:
+        credentials = credential_cache.get()
+
+    req = AWSRequest(
+        method=method,
+        url=url,
+        data=body,
+        params=params,
+        headers=headers
+    )
+    SigV4Auth(credentials, service, region or os.environ.get("AWS_REGION", theRegion)).add_auth(req)
+    return req.prepare()
 
-os.environ["AWS_REGION"] = theRegion
-region = os.environ.get("AWS_REGION")
-llm_response = ""
 
 def sigv4_request(
     url,
@@ -31,8 +238,9 @@ def sigv4_request(
     params=None,
     headers=None,
     service='execute-api',
-    region=os.environ['AWS_REGION'],
-    credentials=Session().get_credentials().get_frozen_credentials()
+    region=None,
+    credentials=None,
+    timeout=None
 ):
     """Sends an HTTP request signed with SigV4
     Args:
@@ -42,143 +250,801 @@ def sigv4_request(
     params: The request query params (e.g. { 'foo': 'bar' }). Defaults to None.
     headers: The request headers (e.g. { 'content-type': 'application/json' }). Defaults to None.
     service: The AWS service name. Defaults to 'execute-api'.
-    region: The AWS region id. Defaults to the env var 'AWS_REGION'.
-    credentials: The AWS credentials. Defaults to the current boto3 session's credentials.
+    region: The AWS region id. Defaults to the env var 'AWS_REGION', or theRegion when unset.
+    credentials: The AWS credentials. Defaults to the shared credential_cache, which resolves the boto3 default chain on first use.
+    timeout: (connect, read) timeouts in seconds, as for requests. Defaults to None (wait forever).
     Returns:
-     The HTTP response
+     The HTTP response, recorded or replayed when a cassette is in use
     """
 
+    # replaying needs neither credentials nor a network
+    if _cassette is not None and _cassette.mode == "replay":
+        return _cassette.play(method, url, body)
+
     # sign request
-    req = AWSRequest(
-        method=method,
-        url=url,
-        data=body,
-        params=params,
-        headers=headers
-    )
-    SigV4Auth(credentials, service, region).add_auth(req)
-    req = req.prepare()
+    req = sign_request(url, method, body, params, headers, service, region, credentials)
 
-    # send request
-    return request(
-        method=req.method,
-        url=req.url,
-        headers=req.headers,
-        data=req.body
-    )
+    # send request over the shared pool; the body is an event stream, so read it as it arrives
+    def send():
+        return get_http_session().request(
+            method=req.method,
+            url=req.url,
+            headers=req.headers,
+            data=req.body,
+            stream=True,
+            timeout=timeout
+        )
+
+    if _cassette is not None:
+        return _cassette.record(send, req.method, req.url, req.headers, req.body)
+    return send()
     
     
 
-def askQuestion(question, url, endSession=False):
+# Headers and body of an InvokeAgent call, shared with the asyncio client
+QUESTION_HEADERS = {
+    'content-type': 'application/json', 
+    'accept': 'application/json',
+}
+
+
+def question_body(question, endSession=False, streaming=False):
     myobj = {
         "inputText": question,   
         "enableTrace": True,
         "endSession": endSession
     }
-    
+    if streaming:
+        # ask the agent to send the final answer in pieces as it is generated
+        myobj["streamingConfigurations"] = {"streamFinalResponse": True}
+    return json.dumps(myobj)
+
+
+# Limits on a single HTTP exchange. The read timeout bounds every socket read,
+# so it is also the longest the agent may go quiet between two pieces of the
+# stream; the request deadline bounds the whole call including retries.
+CONNECT_TIMEOUT = float(os.environ.get("AGENT_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("AGENT_READ_TIMEOUT", "60"))
+
+
+def request_timeout(deadline=None):
+    """(connect, read) timeouts for one attempt, cut down to what is left before deadline."""
+    if deadline is None:
+        return CONNECT_TIMEOUT, READ_TIMEOUT
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise rate_limit.DeadlineExceeded("Request deadline passed before the agent was called")
+    return min(CONNECT_TIMEOUT, remaining), min(READ_TIMEOUT, remaining)
+
+
+def seconds_option(event, name, allow_zero=False):
+    """event[name] as seconds, or None when unset; ValueError unless a positive number."""
+    value = event.get(name)
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number of seconds, got {value!r}") from None
+    # NaN fails both comparisons
+    if not (seconds > 0 or (allow_zero and seconds == 0)) or seconds == float("inf"):
+        raise ValueError(f"{name} must be a {'non-negative' if allow_zero else 'positive'} number of seconds, got {value!r}")
+    return seconds
+
+
+def timeout_of(event):
+    """The event's "timeout" in seconds, or None for the alias's default deadline."""
+    return seconds_option(event, "timeout")
+
+
+def hedge_after_of(event):
+    """The event's "hedgeAfter" in seconds (0 hedges at once), or None for the learnt delay."""
+    return seconds_option(event, "hedgeAfter", allow_zero=True)
+
+
+def check_event(event):
+    """Raises ValueError naming the first invalid option of a question event."""
+    response_options.length_of(event)
+    response_options.question_for(event)
+    timeout_of(event)
+    hedge_after_of(event)
+
+
+def deadline_for(event, alias=None):
+    """Absolute time.monotonic() deadline for an event; "timeout" is in seconds."""
+    timeout = timeout_of(event)
+    if timeout is None:
+        timeout = rate_limit.policy_for(alias or agentAliasId).deadline
+    return time.monotonic() + timeout
+
+
+def read_events(response, deadline=None):
+    """event_stream.iter_events, raising DeadlineExceeded once deadline has passed."""
+    for event in event_stream.iter_events(response):
+        if deadline is not None and time.monotonic() > deadline:
+            raise rate_limit.DeadlineExceeded("The agent did not finish answering within the request deadline")
+        yield event
+
+
+def send_question(question, url, endSession=False, streaming=False, deadline=None):
     # send request
     response = sigv4_request(
         url,
         method='POST',
         service='bedrock',
-        headers={
-            'content-type': 'application/json', 
-            'accept': 'application/json',
-        },
-        region=theRegion,
-        body=json.dumps(myobj)
+        headers=QUESTION_HEADERS,
+        region=region_from_url(url),
+        body=question_body(question, endSession, streaming),
+        timeout=request_timeout(deadline)
     )
-    
-    return decode_response(response)
+    # errors come back as a plain JSON body rather than an event stream
+    try:
+        response.raise_for_status()
+    except Exception:
+        response.close()
+        raise
+    return response
 
 
+def alias_from_url(url):
+    # rate limits and retry policies are configured per agent alias
+    _, _, rest = url.partition("/agentAliases/")
+    return rest.split("/", 1)[0] or agentAliasId
 
 
-def decode_response(response):
-    # Create a StringIO object to capture print statements
-    captured_output = io.StringIO()
-    sys.stdout = captured_output
+def region_from_url(url):
+    # requests are signed for the region they go to; None (the default region)
+    # for endpoints such as AGENT_ENDPOINT_URL that don't name one
+    host = url.split("/")[2] if "://" in url else ""
+    if host.startswith("bedrock-agent-runtime."):
+        return host.split(".")[1]
+    return None
 
-    # Your existing logic
-    string = ""
-    for line in response.iter_content():
-        try:
-            string += line.decode(encoding='utf-8')
-        except:
-            continue
 
-    print("Decoded response", string)
-    split_response = string.split(":message-type")
-    print(f"Split Response: {split_response}")
-    print(f"length of split: {len(split_response)}")
-
-    for idx in range(len(split_response)):
-        if "bytes" in split_response[idx]:
-            #print(f"Bytes found index {idx}")
-            encoded_last_response = split_response[idx].split("\"")[3]
-            decoded = base64.b64decode(encoded_last_response)
-            final_response = decoded.decode('utf-8')
-            print(final_response)
-        else:
-            print(f"no bytes at index {idx}")
-            print(split_response[idx])
-            
-    last_response = split_response[-1]
-    print(f"Lst Response: {last_response}")
-    if "bytes" in last_response:
-        print("Bytes in last response")
-        encoded_last_response = last_response.split("\"")[3]
-        decoded = base64.b64decode(encoded_last_response)
-        final_response = decoded.decode('utf-8')
-    else:
-        print("no bytes in last response")
-        part1 = string[string.find('finalResponse')+len('finalResponse":'):] 
-        part2 = part1[:part1.find('"}')+2]
-        final_response = json.loads(part2)['text']
+def askQuestion(question, url, endSession=False, deadline=None):
+    # Throttles and transient failures are retried with backoff under the
+    # alias's rate limit; each attempt re-sends and re-reads the whole answer.
+    # Nothing runs past deadline (time.monotonic()), which defaults to the
+    # alias's retry policy deadline from now.
+    alias = alias_from_url(url)
+    if deadline is None:
+        deadline = time.monotonic() + rate_limit.policy_for(alias).deadline
+
+    def attempt():
+        trace = AgentTrace()
+        return decode_response(send_question(question, url, endSession, deadline=deadline), trace, deadline)
+
+    return rate_limit.call_with_retry(attempt, alias, deadline)
+
+
+def askQuestion_stream(question, url, endSession=False, trace=None, deadline=None):
+    """Yields the agent's answer text piece by piece as it is decoded.
+
+    Pass an AgentTrace (or a list) as trace to collect the trace events
+    alongside the text. Only opening the stream is retried; once text has
+    been handed out an error mid-stream is raised to the caller.
+    """
+    alias = alias_from_url(url)
+    if deadline is None:
+        deadline = time.monotonic() + rate_limit.policy_for(alias).deadline
+    response = rate_limit.call_with_retry(
+        lambda: send_question(question, url, endSession, streaming=True, deadline=deadline),
+        alias,
+        deadline
+    )
+    final_response = None
+    streamed = False
+    timed = isinstance(trace, AgentTrace)
+    try:
+        for event in read_events(response, deadline):
+            if isinstance(event, event_stream.Chunk):
+                if timed:
+                    trace.chunk_received()
+                text = clean_response(event.text)
+                if text:
+                    streamed = True
+                    yield text
+            else:
+                if trace is not None:
+                    trace.append(event.trace)
+                final_response = final_response_from_trace(event.trace) or final_response
+    except event_stream.EventStreamError as e:
+        if rate_limit.is_throttle(e):
+            rate_limit.limiter_for(alias).on_throttle()
+        raise
+    finally:
+        # hand the connection back to the pool, or drop it if the caller stopped early
+        response.close()
+        if timed:
+            trace.finish()
+
+    if not streamed and final_response:
+        yield clean_response(final_response)
+
+
+def clean_response(text):
+    """Answer text without the JSON quoting some answers arrive in.
+
+    Unwraps an answer sent as {"input": {"value": ...}, "source": null} or as
+    one JSON string; quotes inside the answer itself are kept.
+    """
+    stripped = text.strip()
+    if not stripped.startswith(("{", '"')):
+        return text
+    try:
+        value = json.loads(stripped)
+    except ValueError:
+        return text
+    if isinstance(value, dict) and isinstance(value.get("input"), dict):
+        value = value["input"].get("value")
+    return value if isinstance(value, str) else text
+
+
+def final_response_from_trace(trace):
+    # When the agent answers without streaming chunks the text only shows up
+    # in the orchestration trace's finalResponse observation
+    observation = trace.get("orchestrationTrace", {}).get("observation", {})
+    return observation.get("finalResponse", {}).get("text")
+
+
+def decode_response(response, trace=None, deadline=None):
+    """Reads a whole InvokeAgent response.
+
+    Returns (AgentTrace, answer text). Nothing is printed and no module state
+    is touched, so it is safe to call from many threads at once. Pass the
+    AgentTrace created before sending the request to time it from the start.
+    Raises rate_limit.DeadlineExceeded if the stream is still going at deadline.
+    """
+    if trace is None:
+        trace = AgentTrace()
+    chunks = []
+    final_response = None
+    try:
+        for event in read_events(response, deadline):
+            if isinstance(event, event_stream.Chunk):
+                trace.chunk_received()
+                chunks.append(event.text)
+            else:
+                trace.append(event.trace)
+                final_response = final_response_from_trace(event.trace) or final_response
+    finally:
+        # hand the connection back to the pool
+        response.close()
+    trace.finish()
+
+    if chunks:
+        final_response = "".join(chunks)
+    elif final_response is None:
+        final_response = ""
+
+    return trace, clean_response(final_response)
+
 
-    final_response = final_response.replace("\"", "")
-    final_response = final_response.replace("{input:{value:", "")
-    final_response = final_response.replace(",source:null}}", "")
-    llm_response = final_response
+def latency_breakdown(trace):
+    """Per-step latency and token breakdown of one call; see agent_trace.latency_breakdown."""
+    return trace.latency_breakdown()
 
-    # Restore original stdout
-    sys.stdout = sys.__stdout__
 
-    # Get the string from captured output
-    captured_string = captured_output.getvalue()
+def agent_url(sessionId, agent=None, alias=None, region=None, base=None):
+    agent = agent or agentId
+    alias = alias or agentAliasId
+    region = region or theRegion
+    base = base or endpointUrl
+    if base:
+        return f'{base.rstrip("/")}/agents/{agent}/agentAliases/{alias}/sessions/{sessionId}/text'
+    return f'https://bedrock-agent-runtime.{region}.amazonaws.com/agents/{agent}/agentAliases/{alias}/sessions/{sessionId}/text'
 
-    # Return both the captured output and the final response
-    return captured_string, llm_response
+
+# Answers to repeated questions, shared by every caller in the process
+answer_cache = AnswerCache()
+
+
+def cache_key_for(event):
+    """Cache key for a question event, or None when it must not be cached.
+
+    Keys are global by default; "cacheScope": "session" keys on the sessionId
+    too, for answers that depend on the conversation so far. Requests that end
+    the session are never cached.
+    """
+    if event.get("endSession") in (True, "true"):
+        return None
+    session = event["sessionId"] if event.get("cacheScope") == "session" else None
+    agent = event.get("agentId") or agentId
+    alias = event.get("agentAliasId") or agentAliasId
+    # keyed on the user's own question so normalize_question applies to it;
+    # the length and language instruction only goes to the agent, and both
+    # settings are key parts of their own
+    options = (response_options.length_of(event), response_options.language_of(event))
+    return answer_cache.key(agent, alias, event["question"], session, options)
+
+
+def event_url(event):
+    # events may name another agent and alias than the module defaults
+    return agent_url(event["sessionId"], event.get("agentId"), event.get("agentAliasId"))
+
+
+# With AGENT_REGIONS set, calls go to the fastest healthy region and fail over
+# to the others, see region_router. Events naming their own agentId or
+# agentAliasId still go straight to that agent.
+router = region_router.from_env()
+
+
+def region_url(endpoint, sessionId):
+    return agent_url(sessionId, endpoint.agent, endpoint.alias, endpoint.region, endpoint.endpoint_url)
+
+
+def is_routed(event):
+    return router is not None and not event.get("agentId") and not event.get("agentAliasId")
+
+
+def ask_event(event, question, endSession=False, deadline=None):
+    """askQuestion for an event, through the region router when one is configured."""
+    if not is_routed(event):
+        return askQuestion(question, event_url(event), endSession, deadline)
+    sessionId = event["sessionId"]
+    return router.call(
+        lambda endpoint, budget: askQuestion(question, region_url(endpoint, sessionId), endSession, budget),
+        sessionId,
+        deadline
+    )
+
+
+def ask_event_stream(event, question, endSession=False, trace=None, deadline=None):
+    """askQuestion_stream for an event, through the region router when one is configured."""
+    if not is_routed(event):
+        return askQuestion_stream(question, event_url(event), endSession, trace, deadline)
+    sessionId = event["sessionId"]
+    return router.stream(
+        lambda endpoint, budget: askQuestion_stream(question, region_url(endpoint, sessionId), endSession, trace, budget),
+        sessionId,
+        deadline
+    )
+
+
+# Identical questions asked at the same moment share one upstream call.
+# Keyed like the answer cache, so the session only matters with cacheScope=session.
+inflight = singleflight.SingleFlight()
+
+# Output tokens and latency per responseLength, see response_options
+usage_meter = response_options.UsageMeter()
+
+
+def end_session(sessionId):
+    """Ends an agent session; used by the session manager's background thread."""
+    if gatewayUrl:
+        gateway_lambda_handler({"sessionId": sessionId, "question": "placeholder to end session", "endSession": True})
+        return
+    if router is not None:
+        # the session lives in the region it was routed to, if it was used at all
+        endpoint = router.endpoint_for(sessionId)
+        if endpoint is not None:
+            askQuestion("placeholder to end session", region_url(endpoint, sessionId), endSession=True)
+        return
+    askQuestion("placeholder to end session", agent_url(sessionId), endSession=True)
+
+
+# One agent session per front-end user instead of one shared session; requests
+# on a session run in order and idle sessions are ended in the background.
+# Front-ends ask for an ID with sessions.session_id(user_key, prefix).
+sessions = SessionManager(end_session=end_session)
+
+
+# Hedged requests for latency-sensitive callers: "hedge": true in the event (or
+# AGENT_HEDGE=true for every event) sends a duplicate once the call has run for
+# the p95 of recent latencies, or for "hedgeAfter" seconds, and keeps whichever
+# answer arrives first. The duplicate runs on a throwaway agent session that
+# ends with its answer, so it does not see earlier turns of the conversation.
+HEDGE = os.environ.get("AGENT_HEDGE", "false").lower() == "true"
+hedger = Hedger()
+
+
+# Default number of questions from one batch event that run at the same time
+BATCH_CONCURRENCY = int(os.environ.get("AGENT_BATCH_CONCURRENCY", "8"))
+# options of a batch event passed on to each question that doesn't set its own
+BATCH_OPTIONS = ("endSession", "responseLength", "language", "timeout", "hedge", "hedgeAfter",
+                 "cacheBypass", "cacheScope", "includeLatency", "agentId", "agentAliasId")
+
+
+# One-time setup kept off the request path. With provisioned concurrency it
+# runs while Lambda initialises the environment; otherwise send a warm-up
+# event ({"warmup": true}) after deploying, or the first request pays for it.
+EAGER_INIT = (
+    os.environ.get("AGENT_EAGER_INIT", "false").lower() == "true"
+    or os.environ.get("AWS_LAMBDA_INITIALIZATION_TYPE") == "provisioned-concurrency"
+)
+
+_init_timings = None
+_init_lock = threading.Lock()
+
+
+def init():
+    """Loads the signing and HTTP stacks, opens the connection pool and resolves credentials.
+
+    Runs once per process and returns how long each part took in
+    milliseconds; later calls return the first run's timings.
+    """
+    global _init_timings
+    if _init_timings is None:
+        with _init_lock:
+            if _init_timings is None:
+                timings = {}
+                start = time.perf_counter()
+                import botocore.auth  # noqa: F401
+                import botocore.awsrequest  # noqa: F401
+                timings["signing_import_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+                start = time.perf_counter()
+                get_http_session()
+                timings["http_session_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+                start = time.perf_counter()
+                # replayed traffic is never signed
+                if _cassette is None or _cassette.mode != "replay":
+                    credential_cache.get()
+                timings["credentials_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                _init_timings = timings
+    return _init_timings
+
+
+if EAGER_INIT:
+    try:
+        init()
+    except Exception as e:
+        # a failed warm start must not fail the import; requests retry lazily
+        print(f"Agent client init failed: {e}")
+
+
+def warmup_handler(event, context):
+    try:
+        timings = init()
+    except Exception as e:
+        return {"status_code": 500, "body": json.dumps({"error": str(e)})}
+    return {"status_code": 200, "body": json.dumps({"warm": True, "init": timings})}
 
 
 def lambda_handler(event, context):
     
+    if event.get("warmup"):
+        return warmup_handler(event, context)
+
+    if gatewayUrl:
+        return gateway_lambda_handler(event)
+
+    if "questions" in event:
+        return batch_handler(event, context)
+
     sessionId = event["sessionId"]
     question = event["question"]
     endSession = False
     
     print(f"Session: {sessionId} asked question: {question}")
+
+    # "responseLength" and "language" become a budget and language instruction
+    try:
+        length = response_options.length_of(event)
+        question = response_options.question_for(event)
+        timeout_of(event)
+        hedge_after = hedge_after_of(event)
+    except ValueError as e:
+        return {"status_code": 400, "body": json.dumps({"error": str(e)})}
     
     try:
-        if (event["endSession"] == "true"):
+        if event["endSession"] in (True, "true"):
             endSession = True
     except:
         endSession = False
     
-    url = f'https://bedrock-agent-runtime.{theRegion}.amazonaws.com/agents/{agentId}/agentAliases/{agentAliasId}/sessions/{sessionId}/text'
+    # "cacheBypass": true skips the lookup but still stores the fresh answer
+    cache_key = cache_key_for(event)
+    if cache_key is not None and not event.get("cacheBypass"):
+        body = answer_cache.get(cache_key)
+        if body is not None:
+            return {"status_code": 200, "body": body}
+
+    # end-to-end budget for this call: retries, connect, reads and decoding
+    deadline = deadline_for(event)
+    hedge = event.get("hedge", HEDGE) in (True, "true") or hedge_after is not None
 
-    
     try: 
-        response, trace_data = askQuestion(question, url, endSession)
+        # one request at a time per agent session, other sessions run in parallel
+        def primary():
+            with sessions.ordered(sessionId):
+                return ask_event(event, question, endSession, deadline)
+
+        def duplicate():
+            hedge_event = dict(event, sessionId=f"{sessionId}-hedge-{uuid.uuid4().hex[:8]}")
+            return ask_event(hedge_event, question, True, deadline)
+
+        def ask():
+            start = time.perf_counter()
+            if hedge and not endSession:
+                result = hedger.run(primary, duplicate, hedge_after)
+            else:
+                result = primary()
+                hedger.latencies.observe(time.perf_counter() - start)
+            usage_meter.observe(length, response_options.answer_tokens(result[0]), time.perf_counter() - start)
+            return result
+
+        if cache_key is not None:
+            trace, trace_data = inflight.do(cache_key, ask)
+        else:
+            trace, trace_data = ask()
         
+        result = {"response": str(trace), "trace_data": trace_data}
+        body = json.dumps(result)
+        # an empty answer (no chunk and no finalResponse) is not worth an hour
+        if cache_key is not None and trace_data:
+            answer_cache.set(cache_key, body)
+        if event.get("includeLatency"):
+            # per-step timing of this call only, so it is never cached
+            result["latency"] = latency_breakdown(trace)
+            body = json.dumps(result)
         return {
             "status_code": 200,
             #"body": json.dumps({"response": response, "trace_data": trace_data})
-            "body": json.dumps({"response": response, "trace_data": trace_data})
+            "body": body
         }
     except Exception as e:
         return {
-            "status_code": 500,
+            "status_code": error_status(e, deadline),
             "body": json.dumps({"error": str(e)})
         }
 
+
+def error_status(error, deadline=None):
+    """HTTP status code lambda_handler reports for a failed call."""
+    if isinstance(error, GatewayError):
+        return error.status
+    if rate_limit.is_throttle(error):
+        # still throttled after every retry: tell the caller to back off
+        return 429
+    if isinstance(error, rate_limit.DeadlineExceeded) or (deadline is not None and time.monotonic() >= deadline):
+        # out of time, whether the deadline check or a socket timeout noticed first
+        return 504
+    return 500
+
+
+def batch_shape(event):
+    """(questions, max_concurrency) of a batch event; ValueError if malformed."""
+    questions = event["questions"]
+    if not isinstance(questions, list):
+        raise ValueError(f"questions must be a list, got {type(questions).__name__}")
+    for index, item in enumerate(questions):
+        question = item.get("question") if isinstance(item, dict) else item
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError(f"questions[{index}] must be a question string or a dict with one")
+    max_concurrency = event.get("maxConcurrency", BATCH_CONCURRENCY)
+    if isinstance(max_concurrency, str) and max_concurrency.strip().isdigit():
+        max_concurrency = int(max_concurrency)
+    if isinstance(max_concurrency, bool) or not isinstance(max_concurrency, int) or max_concurrency < 1:
+        raise ValueError(f"maxConcurrency must be a positive whole number, got {max_concurrency!r}")
+    return questions, max_concurrency
+
+
+def batch_handler(event, context):
+    """Answers every entry of event["questions"] concurrently.
+
+    Entries are question strings or dicts with their own "question" and
+    optional "sessionId". Entries without a sessionId get "<sessionId>-<index>"
+    so they don't queue behind each other on one agent session; without an
+    event["sessionId"] each batch gets a fresh one. At most
+    event["maxConcurrency"] (default BATCH_CONCURRENCY) calls run at once.
+    The options in BATCH_OPTIONS apply to every entry unless it sets its own.
+    Results come back in input order, each with its own status_code and
+    elapsed_ms, inside a single 200 response; a malformed batch is a 400.
+    """
+    try:
+        questions, max_concurrency = batch_shape(event)
+    except ValueError as e:
+        return {"status_code": 400, "body": json.dumps({"error": str(e)})}
+    # a fresh prefix per batch, so two batches never share agent sessions
+    sessionId = event.get("sessionId") or f"batch-{uuid.uuid4().hex}"
+
+    def run(index, item):
+        if not isinstance(item, dict):
+            item = {"question": item}
+        start = time.perf_counter()
+        try:
+            single = {
+                "sessionId": item.get("sessionId", f"{sessionId}-{index}"),
+                "question": item["question"]
+            }
+            for option in BATCH_OPTIONS:
+                if option in item or option in event:
+                    single[option] = item.get(option, event.get(option))
+            result = lambda_handler(single, context)
+            status_code = result["status_code"]
+            body = json.loads(result["body"])
+        except Exception as e:
+            # an entry that fails does so on its own instead of sinking the batch
+            status_code = 400
+            body = {"error": str(e)}
+
+        body.update(
+            index=index,
+            question=item.get("question"),
+            status_code=status_code,
+            elapsed_ms=round((time.perf_counter() - start) * 1000, 1)
+        )
+        return body
+
+    start = time.perf_counter()
+    if questions:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(questions)))) as executor:
+            results = list(executor.map(run, range(len(questions)), questions))
+    else:
+        results = []
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "status_code": 200,
+        "body": json.dumps({"results": results, "elapsed_ms": round(elapsed_ms, 1)})
+    }
+
+
+def lambda_handler_stream(event, context, trace=None):
+    """Streaming counterpart of lambda_handler for the Streamlit front-ends.
+
+    Takes the same event and yields answer text as it arrives instead of
+    returning a response dict; errors are raised to the caller.
+    """
+    if gatewayUrl:
+        yield from gateway_stream(event, trace)
+        return
+
+    sessionId = event["sessionId"]
+    question = event["question"]
+    endSession = event.get("endSession") in (True, "true")
+
+    print(f"Session: {sessionId} asked question: {question}")
+
+    length = response_options.length_of(event)
+    question = response_options.question_for(event)
+
+    cache_key = cache_key_for(event)
+    if cache_key is not None and not event.get("cacheBypass"):
+        body = answer_cache.get(cache_key)
+        if body is not None:
+            cached = json.loads(body)
+            if trace is not None:
+                # the stored trace, one JSON document per line as str(AgentTrace) wrote it
+                for line in cached["response"].splitlines():
+                    trace.append(json.loads(line))
+            yield cached["trace_data"]
+            return
+
+    deadline = deadline_for(event)
+    if trace is None:
+        trace = AgentTrace()
+    start = time.perf_counter()
+    if cache_key is None:
+        with sessions.ordered(sessionId):
+            yield from ask_event_stream(event, question, endSession, trace, deadline)
+        usage_meter.observe(length, response_options.answer_tokens(trace), time.perf_counter() - start)
+        return
+
+    while True:
+        call, is_leader = inflight.begin(cache_key)
+        if is_leader:
+            break
+        # the same question is already streaming for someone else; share its answer
+        try:
+            shared_trace, text = call.wait()
+        except singleflight.Cancelled:
+            # its caller went away, which cancels nothing here; ask again,
+            # as the leader if nobody else has taken over yet
+            continue
+        if trace is not None:
+            for item in shared_trace:
+                trace.append(item)
+        yield text
+        return
+
+    chunks = []
+    try:
+        with sessions.ordered(sessionId):
+            for text in ask_event_stream(event, question, endSession, trace, deadline):
+                chunks.append(text)
+                yield text
+    except GeneratorExit:
+        inflight.fail(cache_key, call, singleflight.Cancelled("The leading caller stopped reading"))
+        raise
+    except Exception as e:
+        inflight.fail(cache_key, call, e)
+        raise
+
+    if isinstance(trace, AgentTrace):
+        shared_trace = trace
+    else:
+        shared_trace = AgentTrace()
+        for item in trace:
+            shared_trace.append(item)
+    usage_meter.observe(length, response_options.answer_tokens(shared_trace), time.perf_counter() - start)
+    text = "".join(chunks)
+    inflight.finish(cache_key, call, (shared_trace, text))
+    if text:
+        answer_cache.set(cache_key, json.dumps({"response": str(shared_trace), "trace_data": text}))
+
+
+class GatewayError(Exception):
+    """An error reported by agent_gateway; status is the HTTP status it maps to."""
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+
+def gateway_request(path, event, deadline, stream=False):
+    connect, read = request_timeout(deadline)
+    if not stream:
+        # /invoke sends nothing until the whole answer is ready, so the read
+        # may take all that is left of the deadline, not just READ_TIMEOUT
+        read = max(read, deadline - time.monotonic())
+    return get_http_session().post(
+        gatewayUrl.rstrip("/") + path,
+        data=json.dumps(event),
+        headers={"content-type": "application/json"},
+        stream=stream,
+        timeout=(connect, read)
+    )
+
+
+def gateway_deadline(event):
+    """deadline_for a lambda_handler event sent to the gateway; ValueError if it is malformed."""
+    if "questions" not in event:
+        check_event(event)
+        return deadline_for(event)
+    # a batch answers its questions maxConcurrency at a time, each wave
+    # within the per-question deadline
+    questions, max_concurrency = batch_shape(event)
+    waves = max(1, -(-len(questions) // max_concurrency))
+    return time.monotonic() + waves * (deadline_for(event) - time.monotonic())
+
+
+def gateway_lambda_handler(event):
+    """lambda_handler, answered by the gateway."""
+    import requests
+
+    try:
+        deadline = gateway_deadline(event)
+    except ValueError as e:
+        return {"status_code": 400, "body": json.dumps({"error": str(e)})}
+    try:
+        response = gateway_request("/invoke", event, deadline)
+    except rate_limit.DeadlineExceeded as e:
+        return {"status_code": 504, "body": json.dumps({"error": str(e)})}
+    except requests.RequestException as e:
+        if time.monotonic() >= deadline:
+            # still busy when the deadline ran out: a timeout, not an outage
+            return {"status_code": 504, "body": json.dumps({"error": f"Agent gateway did not answer within the request deadline: {e}"})}
+        return {"status_code": 502, "body": json.dumps({"error": f"Agent gateway unreachable: {e}"})}
+    return {"status_code": response.status_code, "body": response.text}
+
+
+def gateway_stream(event, trace=None):
+    """lambda_handler_stream, answered by the gateway's server-sent events."""
+    import sse
+
+    timed = isinstance(trace, AgentTrace)
+    response = gateway_request("/stream", event, deadline_for(event), stream=True)
+    try:
+        if response.status_code != 200:
+            raise GatewayError(response.json().get("error", response.text), response.status_code)
+        response.encoding = "utf-8"
+        for name, data in sse.iter_events(response.iter_lines(decode_unicode=True)):
+            if name == "chunk":
+                if timed:
+                    trace.chunk_received()
+                yield data
+            elif name == "trace":
+                if trace is not None:
+                    trace.append(data)
+            elif name == "error":
+                raise GatewayError(data["error"], data.get("status_code", 500))
+            elif name == "done":
+                break
+    finally:
+        response.close()
+        if timed:
+            trace.finish()
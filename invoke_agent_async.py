@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+
+import event_stream
+import invoke_agent as agenthelper
+import rate_limit
+import response_options
+import sse
+
+# asyncio counterpart of invoke_agent for the Discord bot and ASGI front-ends.
+# Signing, request bodies and answer clean-up are shared with the blocking
+# client; only the transport and the stream reading are async here.
+
+# How many agent calls one client keeps in flight at once; callers past the
+# limit wait on the semaphore instead of piling more work onto Bedrock.
+MAX_CONCURRENCY = int(os.environ.get("AGENT_MAX_CONCURRENCY", "100"))
+# When set, stream_event goes through agent_gateway instead of Bedrock directly
+GATEWAY_URL = os.environ.get("AGENT_GATEWAY_URL")
+
+
+class AsyncAgentClient:
+    """Runs agent calls on the event loop without a thread per request.
+
+    The aiohttp session is created on first use, so the client can be built
+    outside a running loop. Call close() (or use `async with`) when done.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, region=None, connection_limit=None):
+        self.region = region or agenthelper.theRegion
+        self.max_concurrency = max_concurrency
+        self.connection_limit = connection_limit or max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.connection_limit, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _credentials(self):
+        # The first lookup may hit the network (SSO, instance metadata), so do
+        # it off the loop; afterwards the cache answers without blocking.
+        if agenthelper.credential_cache.resolved:
+            return agenthelper.credential_cache.get()
+        return await asyncio.to_thread(agenthelper.credential_cache.get)
+
+    async def askQuestion_stream(self, question, url, endSession=False, trace=None, deadline=None):
+        """Async generator yielding answer text as each chunk is decoded.
+
+        Pass an AgentTrace (or a list) as trace to collect the trace events
+        alongside the text. Opening the stream is retried under the alias's
+        rate limit like the blocking client; errors mid-stream are raised.
+        Like the blocking client nothing runs past deadline
+        (time.monotonic()), which defaults to the alias's retry policy
+        deadline from now.
+        """
+        alias = agenthelper.alias_from_url(url)
+        body = agenthelper.question_body(question, endSession, streaming=True)
+        if deadline is None:
+            deadline = time.monotonic() + rate_limit.policy_for(alias).deadline
+
+        async def open_stream():
+            # signed per attempt so retries carry a fresh SigV4 timestamp
+            req = agenthelper.sign_request(
+                url,
+                method='POST',
+                service='bedrock',
+                headers=agenthelper.QUESTION_HEADERS,
+                region=self.region,
+                body=body,
+                credentials=await self._credentials()
+            )
+            response = await self._get_session().request(
+                req.method, req.url, headers=dict(req.headers), data=req.body, timeout=client_timeout(deadline)
+            )
+            try:
+                response.raise_for_status()
+            except aiohttp.ClientResponseError:
+                response.release()
+                raise
+            return response
+
+        final_response = None
+        streamed = False
+        timed = isinstance(trace, agenthelper.AgentTrace)
+        async with self._semaphore:
+            response = await rate_limit.call_with_retry_async(open_stream, alias, deadline)
+            try:
+                async for event in iter_events(response, deadline):
+                    if isinstance(event, event_stream.Chunk):
+                        if timed:
+                            trace.chunk_received()
+                        text = agenthelper.clean_response(event.text)
+                        if text:
+                            streamed = True
+                            yield text
+                    else:
+                        if trace is not None:
+                            trace.append(event.trace)
+                        final_response = agenthelper.final_response_from_trace(event.trace) or final_response
+            except event_stream.EventStreamError as e:
+                if rate_limit.is_throttle(e):
+                    rate_limit.limiter_for(alias).on_throttle()
+                raise
+            finally:
+                response.release()
+                if timed:
+                    trace.finish()
+
+        if not streamed and final_response:
+            yield agenthelper.clean_response(final_response)
+
+    async def stream_event(self, event, trace=None):
+        """Async generator over a lambda_handler_stream event.
+
+        Answered by agent_gateway when AGENT_GATEWAY_URL is set, else by
+        Bedrock directly with the event's agentId and agentAliasId. The
+        event's "timeout" bounds the call either way.
+        """
+        deadline = agenthelper.deadline_for(event, event.get("agentAliasId"))
+        if not GATEWAY_URL:
+            url = agenthelper.agent_url(event["sessionId"], event.get("agentId"), event.get("agentAliasId"), self.region)
+            question = response_options.question_for(event)
+            async for text in self.askQuestion_stream(question, url, event.get("endSession") in (True, "true"), trace, deadline):
+                yield text
+            return
+
+        async with self._semaphore:
+            response = await self._get_session().post(
+                GATEWAY_URL.rstrip("/") + "/stream", json=event, timeout=client_timeout(deadline)
+            )
+            try:
+                if response.status != 200:
+                    body = await response.json(content_type=None)
+                    raise agenthelper.GatewayError(body.get("error", str(body)), response.status)
+                decoder = sse.SSEDecoder()
+                async for raw in response.content:
+                    if time.monotonic() > deadline:
+                        raise rate_limit.DeadlineExceeded("The agent did not finish answering within the request deadline")
+                    item = decoder.feed_line(raw.decode("utf-8").rstrip("\r\n"))
+                    if item is None:
+                        continue
+                    name, data = item
+                    if name == "chunk":
+                        yield data
+                    elif name == "trace":
+                        if trace is not None:
+                            trace.append(data)
+                    elif name == "error":
+                        raise agenthelper.GatewayError(data["error"], data.get("status_code", 500))
+                    elif name == "done":
+                        break
+            finally:
+                response.release()
+
+    async def askQuestion(self, question, url, endSession=False, deadline=None):
+        """Returns (AgentTrace, answer) like invoke_agent.askQuestion."""
+        trace = agenthelper.AgentTrace()
+        chunks = []
+        async for text in self.askQuestion_stream(question, url, endSession, trace, deadline):
+            chunks.append(text)
+
+        return trace, "".join(chunks)
+
+    async def lambda_handler(self, event, context):
+        """Same event and response shape as invoke_agent.lambda_handler."""
+        sessionId = event["sessionId"]
+        question = event["question"]
+        endSession = event.get("endSession") in (True, "true")
+
+        print(f"Session: {sessionId} asked question: {question}")
+
+        url = agenthelper.agent_url(sessionId, region=self.region)
+        try:
+            question = response_options.question_for(event)
+            deadline = agenthelper.deadline_for(event)
+        except ValueError as e:
+            return {"status_code": 400, "body": json.dumps({"error": str(e)})}
+        try:
+            trace, trace_data = await self.askQuestion(question, url, endSession, deadline)
+            return {
+                "status_code": 200,
+                "body": json.dumps({"response": str(trace), "trace_data": trace_data})
+            }
+        except Exception as e:
+            return {
+                "status_code": agenthelper.error_status(e, deadline),
+                "body": json.dumps({"error": str(e)})
+            }
+
+
+def client_timeout(deadline):
+    """aiohttp timeouts for one attempt; invoke_agent.request_timeout's limits as a ClientTimeout."""
+    connect, read = agenthelper.request_timeout(deadline)
+    return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+
+
+async def iter_events(response, deadline=None):
+    """Async version of invoke_agent.read_events for an aiohttp response."""
+    decoder = event_stream.AgentEventDecoder()
+    async for data in response.content.iter_chunked(event_stream.CHUNK_SIZE):
+        if deadline is not None and time.monotonic() > deadline:
+            raise rate_limit.DeadlineExceeded("The agent did not finish answering within the request deadline")
+        for event in decoder.feed(data):
+            yield event
+    for event in decoder.close():
+        yield event
@@ -0,0 +1,280 @@
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import event_stream
+
+# Local stand-in for the bedrock-agent-runtime InvokeAgent API, for load and
+# latency testing without paying for Bedrock. It answers
+# POST /agents/{id}/agentAliases/{alias}/sessions/{sid}/text with real binary
+# event-stream frames over chunked HTTP, with tunable answer size, chunking,
+# delays, slow requests in the tail, trace volume, throttling and error injection.
+#
+#   python mock_agent_server.py --port 8900 --chunk-delay 0.02 --throttle-rate 0.05
+#   AGENT_ENDPOINT_URL=http://127.0.0.1:8900 AWS_ACCESS_KEY_ID=test AWS_SECRET_ACCESS_KEY=test streamlit run app.py
+#
+# Requests are not authenticated, so any credentials will do.
+
+PATH_PATTERN = re.compile(r"^/agents/([^/]+)/agentAliases/([^/]+)/sessions/([^/]+)/text$")
+# the word budget response_options appends for a responseLength, followed like a model would
+WORD_BUDGET = re.compile(r"under (\d+) words")
+
+WORDS = ("agent document workflow signature contract search index insight report "
+         "summary snowflake warehouse query result latency stream token model").split()
+
+
+class MockAgentConfig:
+    def __init__(self, answer_bytes=2048, chunk_bytes=64, first_chunk_delay=0.2, chunk_delay=0.01,
+                 trace_steps=2, trace_padding=0, step_delay=0.05, throttle_rate=0.0,
+                 error_rate=0.0, midstream_error_rate=0.0, slow_rate=0.0, slow_delay=5.0, seed=None):
+        self.answer_bytes = answer_bytes
+        self.chunk_bytes = chunk_bytes
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.trace_steps = trace_steps
+        self.trace_padding = trace_padding
+        self.step_delay = step_delay
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.midstream_error_rate = midstream_error_rate
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+
+    def roll(self, rate):
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+
+def make_answer(size):
+    words = []
+    length = 0
+    i = 0
+    while length < size:
+        word = WORDS[i % len(WORDS)]
+        words.append(word)
+        length += len(word) + 1
+        i += 1
+    return " ".join(words)[:size]
+
+
+def chunk_frame(data):
+    payload = json.dumps({"bytes": base64.b64encode(data).decode("ascii")}).encode("utf-8")
+    return event_stream.encode_message(
+        {":event-type": "chunk", ":content-type": "application/json", ":message-type": "event"},
+        payload
+    )
+
+
+def trace_frame(agent, alias, session, trace):
+    payload = json.dumps({
+        "agentId": agent,
+        "agentAliasId": alias,
+        "sessionId": session,
+        "trace": trace
+    }).encode("utf-8")
+    return event_stream.encode_message(
+        {":event-type": "trace", ":content-type": "application/json", ":message-type": "event"},
+        payload
+    )
+
+
+def exception_frame(error_type, message):
+    return event_stream.encode_message(
+        {":exception-type": error_type, ":content-type": "application/json", ":message-type": "exception"},
+        json.dumps({"message": message}).encode("utf-8")
+    )
+
+
+def trace_parts(config, question, answer):
+    """Synthetic trace parts shaped like a real agent run, in the order they are sent."""
+    padding = "x" * config.trace_padding
+    usage = {"inputTokens": 200 + len(question) // 4, "outputTokens": 20}
+    yield {"preProcessingTrace": {"modelInvocationInput": {"traceId": "mock-pre-0", "type": "PRE_PROCESSING", "text": padding}}}
+    yield {"preProcessingTrace": {"modelInvocationOutput": {"traceId": "mock-pre-0", "parsedResponse": {"isValid": True}, "metadata": {"usage": usage}}}}
+    for step in range(config.trace_steps):
+        trace_id = f"mock-orch-{step}"
+        yield {"orchestrationTrace": {"modelInvocationInput": {"traceId": trace_id, "type": "ORCHESTRATION", "text": padding}}}
+        yield {"orchestrationTrace": {"modelInvocationOutput": {"traceId": trace_id, "metadata": {"usage": usage}}}}
+        yield {"orchestrationTrace": {"rationale": {"traceId": trace_id, "text": f"Step {step}: look up {question[:40]}"}}}
+        yield {"orchestrationTrace": {"invocationInput": {"traceId": trace_id, "invocationType": "KNOWLEDGE_BASE",
+                                                          "knowledgeBaseLookupInput": {"knowledgeBaseId": "MOCKKB", "text": question}}}}
+        yield {"orchestrationTrace": {"observation": {"traceId": trace_id, "type": "KNOWLEDGE_BASE",
+                                                      "knowledgeBaseLookupOutput": {"retrievedReferences": [{"content": {"text": padding}}]}}}}
+    # the call that writes the answer, at about four tokens for every three words
+    trace_id = f"mock-orch-{config.trace_steps}"
+    answer_usage = {"inputTokens": usage["inputTokens"], "outputTokens": len(answer.split()) * 4 // 3}
+    yield {"orchestrationTrace": {"modelInvocationInput": {"traceId": trace_id, "type": "ORCHESTRATION", "text": padding}}}
+    yield {"orchestrationTrace": {"modelInvocationOutput": {"traceId": trace_id, "metadata": {"usage": answer_usage}}}}
+    yield {"orchestrationTrace": {"observation": {"traceId": trace_id, "type": "FINISH",
+                                                  "finalResponse": {"text": answer}}}}
+
+
+class MockAgentHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = MockAgentConfig()
+    verbose = False
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def send_json_error(self, status, error_type, message):
+        body = json.dumps({"message": message}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("x-amzn-ErrorType", error_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        try:
+            self.answer()
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up, e.g. on a timeout or after a hedged duplicate won
+            self.close_connection = True
+
+    def answer(self):
+        config = self.config
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+        match = PATH_PATTERN.match(self.path)
+        if match is None:
+            self.send_json_error(404, "ResourceNotFoundException", f"No route for {self.path}")
+            return
+        agent, alias, session = match.groups()
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            self.send_json_error(400, "ValidationException", "Request body is not JSON")
+            return
+
+        with config.lock:
+            config.requests += 1
+        if config.roll(config.throttle_rate):
+            with config.lock:
+                config.throttled += 1
+            self.send_json_error(429, "ThrottlingException", "Rate exceeded")
+            return
+        if config.roll(config.error_rate):
+            with config.lock:
+                config.errors += 1
+            self.send_json_error(500, "InternalServerException", "Injected failure")
+            return
+
+        question = request.get("inputText", "")
+        streaming = request.get("streamingConfigurations", {}).get("streamFinalResponse", False)
+        answer = make_answer(config.answer_bytes)
+        budget = WORD_BUDGET.search(question)
+        if budget is not None:
+            answer = " ".join(answer.split()[:int(budget.group(1))])
+        enable_trace = request.get("enableTrace", False)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("x-amzn-bedrock-agent-session-id", session)
+        self.end_headers()
+
+        time.sleep(config.first_chunk_delay)
+        if config.roll(config.slow_rate):
+            # a request stuck in the tail: nothing more arrives for a while
+            time.sleep(config.slow_delay)
+        for trace in trace_parts(config, question, answer):
+            if enable_trace:
+                self.write_chunk(trace_frame(agent, alias, session, trace))
+            time.sleep(config.step_delay / 2)
+
+        if config.roll(config.midstream_error_rate):
+            with config.lock:
+                config.errors += 1
+            self.write_chunk(exception_frame("internalServerException", "Injected mid-stream failure"))
+            self.write_chunk(b"")
+            return
+
+        data = answer.encode("utf-8")
+        if streaming:
+            for start in range(0, len(data), config.chunk_bytes):
+                self.write_chunk(chunk_frame(data[start:start + config.chunk_bytes]))
+                time.sleep(config.chunk_delay)
+        else:
+            # generating the answer takes as long as when it is streamed
+            time.sleep(config.chunk_delay * -(-len(data) // config.chunk_bytes))
+            self.write_chunk(chunk_frame(data))
+        # zero-length chunk ends the chunked body
+        self.write_chunk(b"")
+
+
+def serve(host="127.0.0.1", port=8900, config=None, verbose=False):
+    """Starts the server in a background thread and returns it; call shutdown() to stop."""
+    handler = type("ConfiguredMockAgentHandler", (MockAgentHandler,), {
+        "config": config or MockAgentConfig(),
+        "verbose": verbose
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Bedrock agent runtime")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--answer-bytes", type=int, default=2048, help="size of each answer")
+    parser.add_argument("--chunk-bytes", type=int, default=64, help="answer bytes per chunk event when streaming")
+    parser.add_argument("--first-chunk-delay", type=float, default=0.2, help="seconds before the first frame")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="seconds between answer chunks")
+    parser.add_argument("--trace-steps", type=int, default=2, help="orchestration steps reported in the trace")
+    parser.add_argument("--trace-padding", type=int, default=0, help="extra bytes of text per trace part")
+    parser.add_argument("--step-delay", type=float, default=0.05, help="seconds spent per trace step")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--midstream-error-rate", type=float, default=0.0, help="fraction of streams ending in an exception event")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests that stall before answering")
+    parser.add_argument("--slow-delay", type=float, default=5.0, help="seconds a slow request stalls for")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    config = MockAgentConfig(
+        answer_bytes=args.answer_bytes,
+        chunk_bytes=args.chunk_bytes,
+        first_chunk_delay=args.first_chunk_delay,
+        chunk_delay=args.chunk_delay,
+        trace_steps=args.trace_steps,
+        trace_padding=args.trace_padding,
+        step_delay=args.step_delay,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        midstream_error_rate=args.midstream_error_rate,
+        slow_rate=args.slow_rate,
+        slow_delay=args.slow_delay,
+        seed=args.seed
+    )
+    server = serve(args.host, args.port, config, args.verbose)
+    print(f"Mock agent runtime listening on http://{args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"requests={config.requests} throttled={config.throttled} errors={config.errors}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import os
+import random
+import sys
+import threading
+import time
+
+from event_stream import EventStreamError
+
+# Client-side flow control for agent calls: a token bucket per agent alias
+# whose rate backs off when Bedrock throttles us and creeps back up while
+# calls succeed, plus jittered exponential retries bounded by a deadline.
+
+RATE = float(os.environ.get("AGENT_RATE_LIMIT", "5"))
+BURST = float(os.environ.get("AGENT_RATE_BURST", "10"))
+MAX_ATTEMPTS = int(os.environ.get("AGENT_MAX_ATTEMPTS", "4"))
+BASE_DELAY = float(os.environ.get("AGENT_RETRY_BASE_DELAY", "0.5"))
+MAX_DELAY = float(os.environ.get("AGENT_RETRY_MAX_DELAY", "8"))
+DEADLINE = float(os.environ.get("AGENT_REQUEST_DEADLINE", "120"))
+
+THROTTLE_STATUS = {429}
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# exception types sent inside the event stream
+THROTTLE_ERRORS = {"throttlingException", "serviceQuotaExceededException"}
+RETRYABLE_ERRORS = THROTTLE_ERRORS | {"internalServerException", "dependencyFailedException", "badGatewayException"}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call cannot start or finish within its deadline."""
+
+
+def _status(exc):
+    # requests.HTTPError carries the response, aiohttp.ClientResponseError the status
+    response = getattr(exc, "response", None)
+    if response is not None:
+        return response.status_code
+    return getattr(exc, "status", None)
+
+
+def is_throttle(exc):
+    if isinstance(exc, EventStreamError):
+        return exc.error_type in THROTTLE_ERRORS
+    return _status(exc) in THROTTLE_STATUS
+
+
+def is_retryable(exc):
+    if isinstance(exc, EventStreamError):
+        return exc.error_type in RETRYABLE_ERRORS
+    status = _status(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # connection resets and timeouts from either requests or aiohttp
+    return isinstance(exc, (OSError, TimeoutError) + _aiohttp_errors())
+
+
+def _aiohttp_errors():
+    # aiohttp's dropped connections (ServerDisconnectedError) and cut-off
+    # bodies are not OSErrors. Nothing can raise them before aiohttp has been
+    # imported, so there is no need to import it just to check.
+    aiohttp = sys.modules.get("aiohttp")
+    if aiohttp is None:
+        return ()
+    import asyncio
+
+    return (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+
+
+class AdaptiveRateLimiter:
+    """Thread-safe token bucket with additive-increase, multiplicative-decrease rate.
+
+    The rate starts at max_rate. Every throttle multiplies it by decrease
+    (at most once per cooldown seconds so one burst of 429s counts once) and
+    every success adds increase requests/second back, up to max_rate.
+    """
+
+    def __init__(self, max_rate=RATE, burst=BURST, min_rate=None, decrease=0.5, increase=None, cooldown=1.0):
+        self.max_rate = max_rate
+        self.min_rate = min_rate if min_rate is not None else max_rate / 20
+        self.burst = burst
+        self.decrease = decrease
+        self.increase = increase if increase is not None else max_rate / 20
+        self.cooldown = cooldown
+        self.rate = max_rate
+        self.throttles = 0
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, deadline=None):
+        """Takes a token and returns how long to wait before using it.
+
+        Returns None, without taking a token, if that wait would run past the
+        time.monotonic() deadline. Async callers sleep on the result themselves.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def acquire(self, deadline=None):
+        wait = self.reserve(deadline)
+        if wait is None:
+            raise DeadlineExceeded("Rate limit wait would exceed the request deadline")
+        if wait:
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            now = time.monotonic()
+            self.throttles += 1
+            if now - self._last_decrease >= self.cooldown:
+                self._refill(now)
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_decrease = now
+
+
+class RetryPolicy:
+    """Jittered exponential backoff bounded by attempts and a per-request deadline."""
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY, deadline=DEADLINE):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def delay(self, attempt):
+        # "full jitter": spread retries from many callers over the whole window
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+_limiters = {}
+_policies = {}
+_registry_lock = threading.Lock()
+
+
+def configure(alias, max_rate=None, burst=None, min_rate=None, max_attempts=None, base_delay=None, max_delay=None, deadline=None):
+    """Sets the rate limit and retry policy used for one agent alias."""
+    with _registry_lock:
+        _limiters[alias] = AdaptiveRateLimiter(
+            max_rate=max_rate if max_rate is not None else RATE,
+            burst=burst if burst is not None else BURST,
+            min_rate=min_rate
+        )
+        _policies[alias] = RetryPolicy(
+            max_attempts=max_attempts if max_attempts is not None else MAX_ATTEMPTS,
+            base_delay=base_delay if base_delay is not None else BASE_DELAY,
+            max_delay=max_delay if max_delay is not None else MAX_DELAY,
+            deadline=deadline if deadline is not None else DEADLINE
+        )
+
+
+def limiter_for(alias):
+    limiter = _limiters.get(alias)
+    if limiter is None:
+        with _registry_lock:
+            limiter = _limiters.setdefault(alias, AdaptiveRateLimiter())
+    return limiter
+
+
+def policy_for(alias):
+    policy = _policies.get(alias)
+    if policy is None:
+        with _registry_lock:
+            policy = _policies.setdefault(alias, RetryPolicy())
+    return policy
+
+
+def stats():
+    """Current rate and throttle count of every alias's limiter."""
+    with _registry_lock:
+        limiters = dict(_limiters)
+    return {
+        alias: {"rate": round(limiter.rate, 3), "max_rate": limiter.max_rate, "throttles": limiter.throttles}
+        for alias, limiter in limiters.items()
+    }
+
+
+def call_with_retry(fn, alias, deadline=None):
+    """Calls fn() under the alias's rate limit, retrying throttles and transient errors.
+
+    deadline is an absolute time.monotonic() value; it defaults to the alias
+    policy's deadline from now. The last error is re-raised once attempts or
+    time run out.
+    """
+    limiter = limiter_for(alias)
+    policy = policy_for(alias)
+    if deadline is None:
+        deadline = time.monotonic() + policy.deadline
+
+    attempt = 0
+    while True:
+        limiter.acquire(deadline)
+        try:
+            result = fn()
+        except Exception as e:
+            if is_throttle(e):
+                limiter.on_throttle()
+            attempt += 1
+            if not is_retryable(e) or attempt >= policy.max_attempts:
+                raise
+            delay = policy.delay(attempt)
+            if time.monotonic() + delay >= deadline:
+                raise
+            time.sleep(delay)
+        else:
+            limiter.on_success()
+            return result
+
+
+async def call_with_retry_async(fn, alias, deadline=None):
+    """asyncio version of call_with_retry; fn is a coroutine function."""
+    import asyncio
+
+    limiter = limiter_for(alias)
+    policy = policy_for(alias)
+    if deadline is None:
+        deadline = time.monotonic() + policy.deadline
+
+    attempt = 0
+    while True:
+        wait = limiter.reserve(deadline)
+        if wait is None:
+            raise DeadlineExceeded("Rate limit wait would exceed the request deadline")
+        if wait:
+            await asyncio.sleep(wait)
+        try:
+            result = await fn()
+        except Exception as e:
+            if is_throttle(e):
+                limiter.on_throttle()
+            attempt += 1
+            if not is_retryable(e) or attempt >= policy.max_attempts:
+                raise
+            delay = policy.delay(attempt)
+            if time.monotonic() + delay >= deadline:
+                raise
+            await asyncio.sleep(delay)
+        else:
+            limiter.on_success()
+            return result
@@ -0,0 +1,299 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import rate_limit
+from hedging import LatencyTracker
+
+# Routing across agents deployed in several regions. Every endpoint keeps a
+# rolling window of call outcomes and latencies. Calls go to the fastest
+# endpoint whose circuit is closed; an endpoint whose error rate crosses
+# error_threshold has its circuit opened and is skipped for open_seconds,
+# after which one trial call decides whether it closes again. A call that
+# fails on one endpoint with a retryable error (throttle, 5xx, timeout) is
+# retried on the next best one, so traffic moves away from a regional
+# brownout instead of timing out with it.
+#
+# Agent sessions stick to the endpoint they started on while its circuit is
+# closed, because conversation state lives in that region's agent.
+#
+#   AGENT_REGIONS="us-east-1:AGENTID:ALIASID,us-west-2:OTHERAGENT:OTHERALIAS"
+#
+# Entries are region[:agentId:agentAliasId][=endpoint URL]; agent and alias
+# default to invoke_agent's. Without AGENT_REGIONS calls go to one region as before.
+
+SPEC = os.environ.get("AGENT_REGIONS", "")
+ERROR_THRESHOLD = float(os.environ.get("AGENT_REGION_ERROR_THRESHOLD", "0.5"))
+MIN_CALLS = int(os.environ.get("AGENT_REGION_MIN_CALLS", "5"))
+OPEN_SECONDS = float(os.environ.get("AGENT_REGION_OPEN_SECONDS", "30"))
+# Off by default: how long a non-streaming call may take in one region while
+# another is left to try. A slow but healthy answer that runs past it is cut
+# off and counted as a failure, so only set it well above normal answer times.
+FAILOVER_AFTER = os.environ.get("AGENT_REGION_FAILOVER_AFTER")
+FAILOVER_AFTER = float(FAILOVER_AFTER) if FAILOVER_AFTER else None
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class NoHealthyEndpoint(Exception):
+    """Raised when every endpoint's circuit is open."""
+
+
+class Endpoint:
+    """One regional agent deployment and its recent health."""
+
+    def __init__(self, region, agent=None, alias=None, endpoint_url=None, window=50):
+        self.region = region
+        self.agent = agent
+        self.alias = alias
+        self.endpoint_url = endpoint_url
+        self.latencies = LatencyTracker(window)
+        self.outcomes = deque(maxlen=window)  # True for success
+        self.state = CLOSED
+        self.opened_at = None
+        self.trial_running = False
+        self.calls = 0
+        self.failures = 0
+        self.opened = 0
+
+    @property
+    def name(self):
+        return f"{self.region}/{self.alias}" if self.alias else self.region
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def __repr__(self):
+        return f"Endpoint({self.name!r}, {self.state})"
+
+
+def parse_spec(spec):
+    """Endpoints from an AGENT_REGIONS value."""
+    endpoints = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        entry, _, endpoint_url = entry.partition("=")
+        parts = entry.split(":")
+        if len(parts) not in (1, 3):
+            raise ValueError(f"AGENT_REGIONS entry {entry!r} is not region or region:agentId:agentAliasId")
+        region, agent, alias = (parts + [None, None])[:3]
+        endpoints.append(Endpoint(region, agent or None, alias or None, endpoint_url or None))
+    return endpoints
+
+
+class RegionRouter:
+    """Picks the fastest healthy endpoint per call and fails over on retryable errors."""
+
+    def __init__(self, endpoints, error_threshold=ERROR_THRESHOLD, min_calls=MIN_CALLS,
+                 open_seconds=OPEN_SECONDS, failover_after=FAILOVER_AFTER, affinity_size=10000):
+        if not endpoints:
+            raise ValueError("RegionRouter needs at least one endpoint")
+        self.endpoints = list(endpoints)
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.failover_after = failover_after
+        self.affinity_size = affinity_size
+        self._affinity = OrderedDict()  # session ID -> Endpoint
+        self._lock = threading.Lock()
+        self.failovers = 0
+
+    def _available(self, endpoint, now):
+        # caller holds self._lock
+        if endpoint.state == OPEN and now - endpoint.opened_at >= self.open_seconds:
+            endpoint.state = HALF_OPEN
+        if endpoint.state == HALF_OPEN:
+            return not endpoint.trial_running
+        return endpoint.state == CLOSED
+
+    def _rank(self, endpoint):
+        # endpoints with no latency yet rank first so each one gets measured;
+        # ties go to the order they were configured in
+        latency = endpoint.latencies.percentile(50)
+        return (latency if latency is not None else 0.0, self.endpoints.index(endpoint))
+
+    def choose(self, session=None, exclude=()):
+        """The endpoint for the next call, or None when none is available.
+
+        A session keeps its endpoint while that endpoint's circuit is closed.
+        Choosing a half-open endpoint makes this call its trial call.
+        """
+        now = time.monotonic()
+        with self._lock:
+            endpoint = self._affinity.get(session) if session is not None else None
+            if endpoint is None or endpoint in exclude or endpoint.state != CLOSED:
+                candidates = [e for e in self.endpoints if e not in exclude and self._available(e, now)]
+                if not candidates:
+                    return None
+                endpoint = min(candidates, key=self._rank)
+            if endpoint.state == HALF_OPEN:
+                endpoint.trial_running = True
+            if session is not None:
+                self._affinity[session] = endpoint
+                self._affinity.move_to_end(session)
+                while len(self._affinity) > self.affinity_size:
+                    self._affinity.popitem(last=False)
+            return endpoint
+
+    def endpoint_for(self, session):
+        """The endpoint a session last used, if the router still remembers it."""
+        with self._lock:
+            return self._affinity.get(session)
+
+    def record_success(self, endpoint, seconds):
+        endpoint.latencies.observe(seconds)
+        with self._lock:
+            endpoint.calls += 1
+            endpoint.outcomes.append(True)
+            if endpoint.state == HALF_OPEN:
+                # the trial call went through; a call that started before the
+                # circuit opened and only now succeeds leaves it open
+                endpoint.state = CLOSED
+                endpoint.outcomes.clear()
+            endpoint.trial_running = False
+
+    def record_failure(self, endpoint):
+        with self._lock:
+            endpoint.calls += 1
+            endpoint.failures += 1
+            endpoint.outcomes.append(False)
+            endpoint.trial_running = False
+            if endpoint.state == HALF_OPEN or (
+                endpoint.state == CLOSED
+                and len(endpoint.outcomes) >= self.min_calls
+                and endpoint.error_rate() >= self.error_threshold
+            ):
+                endpoint.state = OPEN
+                endpoint.opened_at = time.monotonic()
+                endpoint.opened += 1
+
+    def release(self, endpoint):
+        """Ends a call that says nothing about the endpoint's health, e.g. a validation error."""
+        with self._lock:
+            endpoint.trial_running = False
+
+    @staticmethod
+    def is_failure(error):
+        """Whether an error counts against the endpoint and is worth trying elsewhere."""
+        return rate_limit.is_retryable(error) or isinstance(error, rate_limit.DeadlineExceeded)
+
+    def _next_endpoint(self, session, tried, error):
+        endpoint = self.choose(session, tried)
+        if endpoint is None:
+            if error is not None:
+                raise error
+            raise NoHealthyEndpoint(f"Every agent region is unavailable: {', '.join(e.name for e in self.endpoints)}")
+        if tried:
+            with self._lock:
+                self.failovers += 1
+        tried.append(endpoint)
+        return endpoint
+
+    def _should_fail_over(self, endpoint, error, deadline):
+        # records the error against the endpoint if it is the endpoint's fault
+        if not self.is_failure(error):
+            self.release(endpoint)
+            return False
+        self.record_failure(endpoint)
+        return deadline is None or time.monotonic() < deadline
+
+    def call(self, fn, session=None, deadline=None):
+        """Returns fn(endpoint, deadline) from the first endpoint that answers.
+
+        Fails over to the next endpoint on retryable errors. With
+        failover_after set, an endpoint also gets at most that many seconds
+        while another one is left to try; otherwise, and for the last one,
+        calls get whatever remains of deadline (time.monotonic()). Errors that
+        are not the endpoint's fault are raised straight away; otherwise the
+        last endpoint's error is raised.
+        """
+        tried = []
+        error = None
+        while True:
+            endpoint = self._next_endpoint(session, tried, error)
+            budget = deadline
+            if self.failover_after is not None and len(tried) < len(self.endpoints):
+                budget = time.monotonic() + self.failover_after
+                if deadline is not None:
+                    budget = min(budget, deadline)
+            start = time.perf_counter()
+            try:
+                result = fn(endpoint, budget)
+            except Exception as e:
+                if not self._should_fail_over(endpoint, e, deadline):
+                    raise
+                error = e
+                continue
+            self.record_success(endpoint, time.perf_counter() - start)
+            return result
+
+    def stream(self, fn, session=None, deadline=None):
+        """Yields from the iterator fn(endpoint, deadline) of the first endpoint that answers.
+
+        Fails over like call() until the first item arrives, without the
+        failover_after budget, which would also cut off long answers. After
+        that the caller holds part of an answer, so errors are recorded and
+        raised instead.
+        """
+        tried = []
+        error = None
+        while True:
+            endpoint = self._next_endpoint(session, tried, error)
+            start = time.perf_counter()
+            items = iter(fn(endpoint, deadline))
+            try:
+                first = next(items)
+            except StopIteration:
+                self.record_success(endpoint, time.perf_counter() - start)
+                return
+            except Exception as e:
+                if not self._should_fail_over(endpoint, e, deadline):
+                    raise
+                error = e
+                continue
+            break
+
+        try:
+            yield first
+            for item in items:
+                yield item
+        except GeneratorExit:
+            # the caller stopped reading, which says nothing about the endpoint
+            items.close()
+            self.release(endpoint)
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure(endpoint)
+            else:
+                self.release(endpoint)
+            raise
+        self.record_success(endpoint, time.perf_counter() - start)
+
+    def stats(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint in self.endpoints:
+                latency = endpoint.latencies.percentile(50)
+                endpoints[endpoint.name] = {
+                    "state": endpoint.state,
+                    "calls": endpoint.calls,
+                    "failures": endpoint.failures,
+                    "error_rate": round(endpoint.error_rate(), 3),
+                    "latency_ms_p50": round(latency * 1000, 1) if latency is not None else None,
+                    "opened": endpoint.opened
+                }
+            return {"endpoints": endpoints, "failovers": self.failovers, "sessions": len(self._affinity)}
+
+
+def from_env(spec=SPEC):
+    """A router for AGENT_REGIONS, or None when it is unset."""
+    endpoints = parse_spec(spec)
+    return RegionRouter(endpoints) if endpoints else None
@@ -0,0 +1,123 @@
+import os
+import threading
+
+from hedging import LatencyTracker
+
+# The front-ends let users pick a response length and a language. InvokeAgent
+# has no per-request max-tokens setting, so both become an instruction at the
+# end of the input text, which reaches the model whatever the agent's prompt
+# templates look like. Each length has an output-token ceiling; the word budget
+# the model is asked for is derived from it, and UsageMeter records how many
+# output tokens answers really took against that ceiling.
+#
+#   {"sessionId": ..., "question": ..., "responseLength": "Short", "language": "Spanish"}
+
+# output-token ceiling per setting; an empty variable means no ceiling
+CEILINGS = {
+    "Short": os.environ.get("AGENT_MAX_TOKENS_SHORT", "150"),
+    "Medium": os.environ.get("AGENT_MAX_TOKENS_MEDIUM", "400"),
+    "Long": os.environ.get("AGENT_MAX_TOKENS_LONG", "1000"),
+}
+CEILINGS = {length: int(value) if value else None for length, value in CEILINGS.items()}
+DEFAULT_LANGUAGE = "English"
+# English runs at about three words for every four tokens
+WORDS_PER_TOKEN = 0.75
+
+
+def length_of(event):
+    """The event's responseLength as one of CEILINGS' keys, or None."""
+    length = event.get("responseLength")
+    if not length:
+        return None
+    length = str(length).strip().capitalize()
+    if length not in CEILINGS:
+        raise ValueError(f"Unknown responseLength {event['responseLength']!r}, expected one of {', '.join(CEILINGS)}")
+    return length
+
+
+def language_of(event):
+    """The event's language, or None for the default."""
+    language = str(event.get("language") or "").strip()
+    if not language or language.lower() == DEFAULT_LANGUAGE.lower():
+        return None
+    # a language name, not free text for the prompt
+    if len(language) > 40 or not all(c.isalpha() or c in " -()" for c in language):
+        raise ValueError(f"Unsupported language {language!r}")
+    return language
+
+
+def instruction(length=None, language=None):
+    """The text appended to the question for these settings, "" for none."""
+    parts = []
+    ceiling = CEILINGS.get(length)
+    if ceiling is not None:
+        parts.append(f"Keep the answer under {int(ceiling * WORDS_PER_TOKEN)} words.")
+    if language is not None:
+        parts.append(f"Answer in {language}.")
+    return " ".join(parts)
+
+
+def question_for(event):
+    """The input text to send for an event: its question plus any length and language instruction."""
+    text = instruction(length_of(event), language_of(event))
+    if not text:
+        return event["question"]
+    return f"{event['question']}\n\n({text})"
+
+
+def answer_tokens(trace):
+    """Output tokens of the model call that wrote the answer: the last one in the trace.
+
+    Earlier calls (pre-processing, orchestration reasoning) are not bounded by
+    the length instruction, so they are left out.
+    """
+    tokens = 0
+    for event in trace:
+        for stage in event.values():
+            if isinstance(stage, dict) and "modelInvocationOutput" in stage:
+                usage = stage["modelInvocationOutput"].get("metadata", {}).get("usage", {})
+                tokens = usage.get("outputTokens", 0) or 0
+    return tokens
+
+
+class UsageMeter:
+    """Output tokens and latency per response length, against each length's ceiling."""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._settings = {}
+
+    def observe(self, length, tokens, seconds):
+        length = length or "Default"
+        with self._lock:
+            entry = self._settings.get(length)
+            if entry is None:
+                entry = self._settings[length] = {
+                    "calls": 0,
+                    "over_ceiling": 0,
+                    "tokens": LatencyTracker(self.window),
+                    "seconds": LatencyTracker(self.window)
+                }
+            entry["calls"] += 1
+            ceiling = CEILINGS.get(length)
+            if ceiling is not None and tokens > ceiling:
+                entry["over_ceiling"] += 1
+        entry["tokens"].observe(tokens)
+        entry["seconds"].observe(seconds)
+
+    def stats(self):
+        with self._lock:
+            settings = dict(self._settings)
+        result = {}
+        for length, entry in settings.items():
+            seconds = entry["seconds"].percentile(50)
+            result[length] = {
+                "ceiling": CEILINGS.get(length),
+                "calls": entry["calls"],
+                "over_ceiling": entry["over_ceiling"],
+                "output_tokens_p50": entry["tokens"].percentile(50),
+                "output_tokens_p95": entry["tokens"].percentile(95),
+                "latency_ms_p50": round(seconds * 1000, 1) if seconds is not None else None
+            }
+        return result
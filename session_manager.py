@@ -0,0 +1,159 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Agent sessions per user instead of one hard-coded session for everybody.
+#
+# Each front-end user (a Streamlit browser session, a Discord channel, ...)
+# gets its own agent session ID the first time it asks something. Requests on
+# one agent session run one at a time in arrival order, because the agent
+# keeps conversation state per session; different sessions run in parallel.
+# Sessions idle for longer than idle_timeout seconds are dropped and ended
+# on a background thread, so no request ever waits for that cleanup.
+
+IDLE_TIMEOUT = float(os.environ.get("AGENT_SESSION_IDLE_TIMEOUT", "1800"))
+SWEEP_INTERVAL = float(os.environ.get("AGENT_SESSION_SWEEP_INTERVAL", "60"))
+
+
+class _SessionLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+
+
+class SessionManager:
+    """Maps user keys to agent session IDs, orders requests per session and expires idle ones.
+
+    end_session(session_id) is called on a background thread for every
+    session that expires or is ended; errors from it are printed and dropped.
+    """
+
+    def __init__(self, end_session=None, idle_timeout=IDLE_TIMEOUT, sweep_interval=SWEEP_INTERVAL):
+        self.end_session = end_session
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._sessions = {}  # user key -> [session_id, last_used]
+        self._ordering = {}  # session_id -> _SessionLock
+        self._ending = queue.Queue()
+        self._worker = None
+        self._sweeper = None
+        self.created = 0
+        self.expired = 0
+        self.ended = 0
+
+    @staticmethod
+    def new_key():
+        """A fresh user key, e.g. for one Streamlit browser session."""
+        return uuid.uuid4().hex
+
+    def session_id(self, key, prefix="SESSION"):
+        """The agent session ID for a user key, starting a new session if it has none."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None or now - entry[1] > self.idle_timeout:
+                if entry is not None:
+                    self._retire(entry[0])
+                    self.expired += 1
+                entry = self._sessions[key] = [f"{prefix}-{uuid.uuid4().hex}", now]
+                self.created += 1
+            else:
+                entry[1] = now
+            self._start_threads()
+            return entry[0]
+
+    def end(self, key):
+        """Forgets the user's session and ends it in the background; returns its ID or None."""
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+            if entry is None:
+                return None
+            self._retire(entry[0])
+            return entry[0]
+
+    def discard(self, key):
+        """Forgets the user's session without ending it, for callers that ended it themselves."""
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+            return entry[0] if entry is not None else None
+
+    @contextmanager
+    def ordered(self, session_id):
+        """Runs the body once every earlier request on the same session has finished."""
+        with self._lock:
+            holder = self._ordering.get(session_id)
+            if holder is None:
+                holder = self._ordering[session_id] = _SessionLock()
+            holder.users += 1
+        try:
+            # threading.Lock is not FIFO, but waiters are few per session
+            with holder.lock:
+                yield
+        finally:
+            with self._lock:
+                holder.users -= 1
+                if holder.users == 0 and self._ordering.get(session_id) is holder:
+                    del self._ordering[session_id]
+
+    def expire_idle(self):
+        """Ends every session idle for longer than idle_timeout; returns how many."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [key for key, (_, last_used) in self._sessions.items() if last_used < cutoff]
+            for key in idle:
+                session_id, _ = self._sessions.pop(key)
+                self._retire(session_id)
+            self.expired += len(idle)
+        return len(idle)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": len(self._sessions),
+                "in_flight": len(self._ordering),
+                "created": self.created,
+                "expired": self.expired,
+                "ended": self.ended,
+                "ending": self._ending.qsize()
+            }
+
+    def _retire(self, session_id):
+        # caller holds self._lock
+        if self.end_session is not None:
+            self._ending.put(session_id)
+            self._start_threads()
+
+    def _start_threads(self):
+        # caller holds self._lock; started on first use so importing stays cheap
+        if self._worker is None and self.end_session is not None:
+            self._worker = threading.Thread(target=self._end_sessions, name="agent-session-end", daemon=True)
+            self._worker.start()
+        if self._sweeper is None and self.sweep_interval > 0:
+            self._sweeper = threading.Thread(target=self._sweep, name="agent-session-sweep", daemon=True)
+            self._sweeper.start()
+
+    def _end_sessions(self):
+        while True:
+            session_id = self._ending.get()
+            try:
+                # wait for anything still running on the session before ending it
+                with self.ordered(session_id):
+                    self.end_session(session_id)
+                with self._lock:
+                    self.ended += 1
+            except Exception as e:
+                print(f"Ending agent session {session_id} failed: {e}")
+
+    def _sweep(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.expire_idle()
+            except Exception as e:
+                print(f"Agent session sweep failed: {e}")
@@ -0,0 +1,90 @@
+import threading
+
+# Coalesces identical requests that are in flight at the same time: the first
+# caller for a key does the work and everyone who asks for the same key
+# before it finishes waits for, and shares, that one result or error.
+# Nothing is kept once the call completes, so answers are never stale.
+#
+# A leader whose own caller stops waiting (a closed stream, a cancelled job)
+# fails the call with Cancelled. That cancels nothing for the followers, who
+# may be other users asking the same question, so they start the call again
+# instead of sharing the error, one of them becoming the new leader.
+
+
+class Cancelled(Exception):
+    """Raised by or for a caller that stopped waiting; followers retry instead of failing."""
+
+
+class Call:
+    """One in-flight call that followers can wait on."""
+
+    __slots__ = ("_done", "result", "error", "followers")
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("Timed out waiting for the shared in-flight request")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def begin(self, key):
+        """Returns (call, is_leader). The leader must finish() or fail() the call."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.shared += 1
+                return call, False
+            call = self._calls[key] = Call()
+            self.leaders += 1
+            return call, True
+
+    def finish(self, key, call, result):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result = result
+        call._done.set()
+
+    def fail(self, key, call, error):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.error = error
+        call._done.set()
+
+    def do(self, key, fn, timeout=None):
+        """Runs fn() once for all concurrent callers with the same key."""
+        while True:
+            call, is_leader = self.begin(key)
+            if is_leader:
+                break
+            try:
+                return call.wait(timeout)
+            except Cancelled:
+                continue
+        try:
+            result = fn()
+        except BaseException as e:
+            self.fail(key, call, e)
+            raise
+        self.finish(key, call, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls)}
@@ -0,0 +1,54 @@
+import json
+
+# Server-sent events as spoken between agent_gateway and its clients: every
+# event has a name and one line of JSON data.
+#
+#   event: chunk
+#   data: "Hello"
+#
+
+
+def encode(event, data):
+    """One server-sent event as bytes."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+class SSEDecoder:
+    """Turns lines of an event stream back into (event, data) pairs."""
+
+    def __init__(self):
+        self._event = "message"
+        self._data = []
+
+    def feed_line(self, line):
+        """Takes one line without its newline; returns (event, data) when one is complete, else None."""
+        if not line:
+            if not self._data:
+                return None
+            event, data = self._event, json.loads("\n".join(self._data))
+            self._event = "message"
+            self._data = []
+            return event, data
+        if line.startswith(":"):
+            # comment, used as a keep-alive
+            return None
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "event":
+            self._event = value
+        elif field == "data":
+            self._data.append(value)
+        return None
+
+
+def iter_events(lines):
+    """Yields (event, data) from an iterable of text lines, e.g. requests' iter_lines()."""
+    decoder = SSEDecoder()
+    for line in lines:
+        item = decoder.feed_line(line.rstrip("\r\n"))
+        if item is not None:
+            yield item
+    item = decoder.feed_line("")
+    if item is not None:
+        yield item
@@ -1,7 +1,7 @@
-import boto3
+import aws_resources
 
-# Initialize Bedrock client
-client = boto3.client(service_name="bedrock-runtime", region_name="us-east-1")
+# Initialize Bedrock client (shared with anything else in the process that asks for it)
+client = aws_resources.client("bedrock-runtime", region_name="us-east-1")
 
 from langchain import LLMChain
 from langchain_aws import ChatBedrock